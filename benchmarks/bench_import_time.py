@@ -0,0 +1,101 @@
+"""
+benchmark import time of client module and cli entry point, and which heavy dependencies
+they pull in. each sample runs in a fresh interpreter with ``-X importtime``::
+
+    PYTHONPATH=. python benchmarks/bench_import_time.py --repeat 5 --max-ms 300
+
+exit with status 1 if any target's median import time exceeds ``--max-ms``, so it can guard
+against regressions in ci.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pandas', 'numpy', 'kubernetes', 'requests', 'mlflow', 'docker', 'git', 'redis']
+
+TARGETS = {
+    'client': 'import mlflow_kubernetes.client',
+    'cli_help': '\n'.join([
+        'from mlflow_kubernetes.cli import cli',
+        'try:',
+        "    cli(['models', '--help'])",
+        'except SystemExit:',
+        '    pass',
+    ]),
+}
+
+REPORT_LOADED = '\n'.join([
+    'import sys, json',
+    'sys.stderr.write("HEAVY " + json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)) + "\\n")',
+])
+
+
+def import_time_us(stderr):
+    """sum self time of every module imported, from ``-X importtime`` output"""
+    total = 0
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            self_us = line.split(':', 1)[1].split('|')[0].strip()
+            if self_us.isdigit():
+                total += int(self_us)
+    return total
+
+
+def measure(code):
+    script = code + '\n' + REPORT_LOADED.format(heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+    )
+    heavy = []
+    for line in proc.stderr.splitlines():
+        if line.startswith('HEAVY '):
+            heavy = json.loads(line[len('HEAVY '):])
+    return import_time_us(proc.stderr) / 1000, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per target')
+    parser.add_argument('--max-ms', type=float, default=None, help='fail if median import time exceeds it')
+    parser.add_argument('--output', '-o', default=None, help='save json result to file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, code in TARGETS.items():
+        samples = []
+        heavy = []
+        for _ in range(args.repeat):
+            elapsed, heavy = measure(code)
+            samples.append(elapsed)
+        results[name] = dict(
+            median_ms=statistics.median(samples), min_ms=min(samples), max_ms=max(samples),
+            heavy_modules=heavy,
+        )
+
+    result = {
+        'benchmark': 'import_time',
+        'python': platform.python_version(),
+        'params': vars(args),
+        'targets': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+    if args.max_ms is not None:
+        slow = [name for name, r in results.items() if r['median_ms'] > args.max_ms]
+        if slow:
+            sys.stderr.write('import time regression: {}\n'.format(', '.join(slow)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+benchmark how many model events per second the server can route through its message bus.
+
+in-memory message buses stand in for redis, fake ``KubernetesDeployment`` and
+``DockerModelImageRegistry`` simulate build/push/deploy with configurable latencies, so
+only dispatching cost of ``mlflow_kubernetes`` itself is measured. results are printed
+as json, or saved by ``--output``, to be compared between revisions::
+
+    PYTHONPATH=. python benchmarks/bench_messagebus.py --events 2000 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+
+from mlflow_kubernetes.entrypoints.async_messagebus import AsyncInMemoryMessageBus
+from mlflow_kubernetes.entrypoints.messagebus import InMemoryMessageBus
+from mlflow_kubernetes.entrypoints.models_handlers import ModelCreateHandler
+
+
+def _simulate(latency):
+    # even sleep(0) is a syscall, which would outweigh dispatching itself
+    if latency:
+        time.sleep(latency)
+
+
+class FakeDockerModelImageRegistry:
+    """
+    stand-in of :py:class:`mlflow_kubernetes.deployments.model_registry.DockerModelImageRegistry`
+    """
+
+    def __init__(self, image_name, registry_uri, image_tag='latest', build_latency=0.0, push_latency=0.0):
+        self._image_name = image_name
+        self._image_tag = image_tag
+        self.build_latency = build_latency
+        self.push_latency = push_latency
+
+    @property
+    def image_name(self):
+        return 'localhost/fake/{}:{}'.format(self._image_name, self._image_tag)
+
+    def create_image_from_uri(self, uri, **kwargs):
+        _simulate(self.build_latency)
+        self.push_image_to_repository()
+
+    def push_image_to_repository(self):
+        _simulate(self.push_latency)
+
+
+class FakeKubernetesDeployment:
+    """
+    stand-in of :py:class:`mlflow_kubernetes.deployments.kubernetes.KubernetesDeployment`,
+    records when every model version finished deploying.
+    """
+
+    def __init__(self, build_latency=0.0, push_latency=0.0, deploy_latency=0.0):
+        self.build_latency = build_latency
+        self.push_latency = push_latency
+        self.deploy_latency = deploy_latency
+        self.deployed = {}
+        self._lock = threading.Lock()
+        self._all_deployed = threading.Event()
+        self._expected = None
+
+    def expect(self, count):
+        self._expected = count
+        self._all_deployed.clear()
+
+    def wait(self, timeout=None):
+        return self._all_deployed.wait(timeout)
+
+    def create_deployment(self, name, version, model_uri):
+        registry = FakeDockerModelImageRegistry(
+            name, None, version, build_latency=self.build_latency, push_latency=self.push_latency
+        )
+        registry.create_image_from_uri(model_uri)
+        _simulate(self.deploy_latency)
+        with self._lock:
+            self.deployed['{}-{}'.format(name, version)] = time.perf_counter()
+            if self._expected is not None and len(self.deployed) >= self._expected:
+                self._all_deployed.set()
+
+
+class NoopHandler:
+    topics = ['model_created']
+
+    def handle(self, topic, event):
+        return None
+
+
+def model_created_event(i, extra_tags=0):
+    return {
+        'model': {
+            'name': 'bench-model',
+            'version': str(i),
+            'source': 'models:/bench-model/{}'.format(i),
+            'tags': {'tag-{}'.format(t): 'x' * 32 for t in range(extra_tags)},
+        }
+    }
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+    return {
+        'mean': statistics.mean(samples),
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'p99': percentile(99),
+        'max': samples[-1],
+    }
+
+
+def bench_dispatch_throughput(events):
+    """events/sec routed from publish to ``ModelCreateHandler`` with zero cost deployment"""
+    kube = FakeKubernetesDeployment()
+    bus = InMemoryMessageBus(ModelCreateHandler(kube))
+    for i in range(events):
+        bus.dispatch_event('model_created', model_created_event(i))
+    bus.stop()
+
+    start = time.perf_counter()
+    bus.run()
+    elapsed = time.perf_counter() - start
+    assert len(kube.deployed) == events
+    return {'events': events, 'seconds': elapsed, 'events_per_sec': events / elapsed}
+
+
+def bench_fanout(events, fanouts):
+    """cost per handler when many handlers subscribe the same topic"""
+    results = []
+    for fanout in fanouts:
+        bus = InMemoryMessageBus(*[NoopHandler() for _ in range(fanout)])
+        for i in range(events):
+            bus.dispatch_event('model_created', model_created_event(i))
+        bus.stop()
+
+        start = time.perf_counter()
+        bus.run()
+        elapsed = time.perf_counter() - start
+        results.append({
+            'handlers': fanout,
+            'events_per_sec': events / elapsed,
+            'usec_per_event': elapsed / events * 1e6,
+            'usec_per_handler_call': elapsed / (events * fanout) * 1e6,
+        })
+    return results
+
+
+def bench_json_decode(events, tag_counts):
+    """json encode/decode cost per event of different payload size"""
+    results = []
+    for tags in tag_counts:
+        event = model_created_event(0, extra_tags=tags)
+        payload = json.dumps(event)
+
+        start = time.perf_counter()
+        for _ in range(events):
+            json.loads(payload)
+        decode = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(events):
+            json.dumps(event)
+        encode = time.perf_counter() - start
+        results.append({
+            'payload_bytes': len(payload),
+            'usec_decode': decode / events * 1e6,
+            'usec_encode': encode / events * 1e6,
+        })
+    return results
+
+
+def bench_sync_end_to_end(events, latencies):
+    """event-to-deploy latency of blocking ``MessageBus``, events are handled one by one"""
+    kube = FakeKubernetesDeployment(**latencies)
+    kube.expect(events)
+    bus = InMemoryMessageBus(ModelCreateHandler(kube))
+    runner = threading.Thread(target=bus.run, daemon=True)
+    runner.start()
+
+    published = {}
+    start = time.perf_counter()
+    for i in range(events):
+        published['bench-model-{}'.format(i)] = time.perf_counter()
+        bus.dispatch_event('model_created', model_created_event(i))
+    kube.wait()
+    elapsed = time.perf_counter() - start
+    bus.stop()
+    runner.join()
+
+    return dict(
+        concurrency=1, events_per_sec=events / elapsed,
+        latency=summarize([kube.deployed[key] - at for key, at in published.items()])
+    )
+
+
+def bench_async_end_to_end(events, concurrency, latencies):
+    """event-to-deploy latency of ``AsyncMessageBus`` with *concurrency* events in flight"""
+    kube = FakeKubernetesDeployment(**latencies)
+    kube.expect(events)
+    bus = AsyncInMemoryMessageBus(ModelCreateHandler(kube), max_in_flight=concurrency)
+    published = {}
+
+    async def scenario():
+        runner = asyncio.ensure_future(bus.run())
+        # let bus subscribe topics before publishing
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        for i in range(events):
+            published['bench-model-{}'.format(i)] = time.perf_counter()
+            await bus.dispatch_event('model_created', model_created_event(i))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, kube.wait)
+        elapsed = time.perf_counter() - start
+        bus.stop()
+        await runner
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    return dict(
+        concurrency=concurrency, events_per_sec=events / elapsed,
+        latency=summarize([kube.deployed[key] - at for key, at in published.items()])
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=2000,
+                        help='events of throughput, fan-out and json benchmarks')
+    parser.add_argument('--deploy-events', type=int, default=64,
+                        help='events of end-to-end benchmarks')
+    parser.add_argument('--fanout', default='1,2,4,8,16', help='handlers per topic')
+    parser.add_argument('--concurrency', default='1,2,4,8,16', help='asyncio bus in-flight events')
+    parser.add_argument('--build-latency', type=float, default=0.02, help='fake image build seconds')
+    parser.add_argument('--push-latency', type=float, default=0.01, help='fake image push seconds')
+    parser.add_argument('--deploy-latency', type=float, default=0.005, help='fake kubernetes seconds')
+    parser.add_argument('--output', '-o', default=None, help='save json result to file')
+    args = parser.parse_args(argv)
+
+    latencies = dict(build_latency=args.build_latency, push_latency=args.push_latency,
+                     deploy_latency=args.deploy_latency)
+    result = {
+        'benchmark': 'messagebus',
+        'python': platform.python_version(),
+        'params': vars(args),
+        'dispatch_throughput': bench_dispatch_throughput(args.events),
+        'fanout': bench_fanout(args.events, [int(n) for n in args.fanout.split(',')]),
+        'json': bench_json_decode(args.events, [0, 16, 256]),
+        'end_to_end': {
+            'sync': bench_sync_end_to_end(args.deploy_events, latencies),
+            'asyncio': [
+                bench_async_end_to_end(args.deploy_events, int(n), latencies)
+                for n in args.concurrency.split(',')
+            ],
+        },
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""
+mlflow models deployed to kubernetes, and client to access them.
+
+``ModelService`` is resolved on first access, so importing the package doesn't pull in
+its heavy dependencies.
+"""
+
+
+def __getattr__(name):
+    if name == 'ModelService':
+        from mlflow_kubernetes.client import ModelService
+        return ModelService
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
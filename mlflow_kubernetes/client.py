@@ -1,34 +1,72 @@
 """
 invoke mlflow deployed in kubernetes clusts through construct a ``ModelService`` instance.
+
+``pandas``, ``requests`` and ``kubernetes`` are imported when first used, keep importing
+this module cheap for short-lived callers.
+
+outside the cluster models are reached through ``host_ip:node_port``. inside the cluster pod
+endpoints are used directly to skip kube-proxy, the ones on caller's node first, then the ones
+in caller's zone, then others, with service cluster ip as the last resort.
 """
+import os
+import random
 from itertools import product
-
-import pandas
-import requests
-from kubernetes import config as kube_config, client
+from typing import TYPE_CHECKING
 
 # not import variables directly, as we expects users will change them
 from . import config
+from .logger import logger
 
+if TYPE_CHECKING:
+    import pandas
 
-def _df_to_dict(df: pandas.DataFrame):
+
+def _df_to_dict(df: 'pandas.DataFrame'):
     data = dict(columns=df.columns.to_list())
     data['data'] = df.values.tolist()
     return data
 
 
+SERVICE_ACCOUNT_PATH = '/var/run/secrets/kubernetes.io/serviceaccount'
+
+
+def _is_in_cluster(kube_config_path=None):
+    if config.KUBE_IN_CLUSTER is not None:
+        return config.KUBE_IN_CLUSTER.lower() in ('1', 'true', 'yes')
+    # kube config given explicitly is meant to be used, even running inside a cluster
+    if kube_config_path:
+        return False
+    return 'KUBERNETES_SERVICE_HOST' in os.environ and os.path.exists(
+        os.path.join(SERVICE_ACCOUNT_PATH, 'token')
+    )
+
+
 class ModelService:
     """
     kubernetes service client provide inference from input dataframe
     """
 
-    def __init__(self, model_name, version, kube_config_path=None):
-        kube_config.load_kube_config(config_file=kube_config_path)
+    def __init__(self, model_name, version, kube_config_path=None, in_cluster=None):
+        """
+        :param kube_config_path: kube config file, given it means caller is outside the cluster
+                                 unless *in_cluster* is true
+        :param in_cluster: route to pods directly as caller runs inside the cluster,
+                           detected from environment by default
+        """
+        import requests
+        from kubernetes import config as kube_config, client
+
+        self.in_cluster = _is_in_cluster(kube_config_path) if in_cluster is None else in_cluster
+        if self.in_cluster:
+            kube_config.load_incluster_config()
+        else:
+            kube_config.load_kube_config(config_file=kube_config_path)
         self._request = requests.Session()
         self.model_name = f"{model_name}-{version}"
         self._kube = client.CoreV1Api()
-        # host port used to access model service running in kubernetes
-        self._host_port_pairs = set()
+        # host port used to access model service running in kubernetes, nearest first
+        self._host_port_pairs = []
+        self._node_zones = {}
 
     def get_service_host_port(self):
         name = self.model_name
@@ -50,19 +88,108 @@ class ModelService:
 
         return set(product(hosts, ports))
 
-    def predict(self, df: pandas.DataFrame) -> pandas.DataFrame:
+    def get_service_endpoints(self, fallback=True):
+        """
+        host port pairs to access model service, ordered by preference
+
+        :param fallback: append service cluster ip after pod endpoints when in cluster
+        :return: list of (host, port) tuple, node ports if pod endpoints not permitted to read
+        """
+        if not self.in_cluster:
+            return sorted(self.get_service_host_port())
+
+        from kubernetes.client.rest import ApiException
+
+        try:
+            return self.get_cluster_endpoints(fallback=fallback)
+        except ApiException as e:
+            if e.status not in (403, 404):
+                raise
+            # service account without permission on endpoints, node ports still work
+            logger.warning('endpoints of %s not readable (%s %s), use node ports instead',
+                           self.model_name, e.status, e.reason)
+            return sorted(self.get_service_host_port())
+
+    def get_cluster_endpoints(self, fallback=True):
+        """
+        ready pod endpoints ordered by locality to caller, same node, same zone then others,
+        endpoints of the same locality are shuffled to spread load among callers.
+
+        :param fallback: append service cluster ip as last resort
+        """
+        name = self.model_name
+        local_node = self._local_node_name()
+        local_zone = self._node_zone(local_node)
+
+        ranked = [[], [], []]
+        endpoints = self._kube.read_namespaced_endpoints(name=name, namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE)
+        for subset in endpoints.subsets or []:
+            for address, port in product(subset.addresses or [], subset.ports or []):
+                if local_node and address.node_name == local_node:
+                    rank = 0
+                elif local_zone and self._node_zone(address.node_name) == local_zone:
+                    rank = 1
+                else:
+                    rank = 2
+                ranked[rank].append((address.ip, port.port))
+
+        host_port_pairs = []
+        for pairs in ranked:
+            random.shuffle(pairs)
+            host_port_pairs.extend(pairs)
+
+        if not fallback:
+            return host_port_pairs
+
+        service = self._kube.read_namespaced_service(name=name, namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE)
+        if service.spec.cluster_ip and service.spec.cluster_ip != 'None':
+            host_port_pairs.extend((service.spec.cluster_ip, port.port) for port in service.spec.ports)
+        return host_port_pairs
+
+    def _local_node_name(self):
+        if config.KUBE_NODE_NAME:
+            return config.KUBE_NODE_NAME
+        from kubernetes.client.rest import ApiException
+
+        # pod name is the hostname by default
+        try:
+            with open(os.path.join(SERVICE_ACCOUNT_PATH, 'namespace')) as f:
+                namespace = f.read().strip()
+            pod = self._kube.read_namespaced_pod(name=os.environ['HOSTNAME'], namespace=namespace)
+        except (OSError, KeyError, ApiException):
+            return None
+        return pod.spec.node_name
+
+    def _node_zone(self, node_name):
+        """zone of node, None if unknown or not permitted to read nodes"""
+        if not node_name:
+            return None
+        if node_name not in self._node_zones:
+            from kubernetes.client.rest import ApiException
+
+            try:
+                labels = self._kube.read_node(name=node_name).metadata.labels or {}
+            except ApiException:
+                labels = {}
+            self._node_zones[node_name] = labels.get(config.KUBE_TOPOLOGY_ZONE_LABEL)
+        return self._node_zones[node_name]
+
+    def predict(self, df: 'pandas.DataFrame') -> 'pandas.DataFrame':
         """
         method input/output interface like :py:meth:`mlflow.pyfunc.PyFuncModel.predict
         :param df: dict of dataframe
         :return: a pandas dataframe
         """
+        import pandas
+        import requests
+
         if isinstance(df, pandas.DataFrame):
             body = _df_to_dict(df)
         else:
             body = df
 
         if not self._host_port_pairs:
-            self._host_port_pairs = self.get_service_host_port()
+            self._host_port_pairs = self.get_service_endpoints()
 
         invalidate_idx = set()
         resp = None
@@ -75,7 +202,7 @@ class ModelService:
             else:
                 break
 
-        self._host_port_pairs -= invalidate_idx
+        self._host_port_pairs = [pair for pair in self._host_port_pairs if pair not in invalidate_idx]
         # none of these request success connected
         if resp is None:
             raise ConnectionError(
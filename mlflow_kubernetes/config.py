@@ -13,12 +13,44 @@ KUBE_MLLFOW_MODELS_NAMESPACE = 'default'
 # mlflow model image listen port
 MLFLOW_MODEL_DEFAULT_TARGET_PORT = 8080
 
+# micro-batching sidecar proxies model pods when max batch size is greater than 0
+KUBE_MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get('KUBE_MICROBATCH_MAX_BATCH_SIZE', 0))
+# milliseconds a request waits for others at most
+KUBE_MICROBATCH_MAX_LATENCY_MS = float(os.environ.get('KUBE_MICROBATCH_MAX_LATENCY_MS', 5))
+# python image sidecar runs in, the proxy only needs standard library
+KUBE_MICROBATCH_IMAGE = os.environ.get('KUBE_MICROBATCH_IMAGE', 'python:3.8-slim')
+# sidecar listen port, service targets it instead of model port
+KUBE_MICROBATCH_PORT = 8081
+
+# client inside cluster reaches pods directly, nearest first. set to ``false`` to force NodePort
+KUBE_IN_CLUSTER = os.environ.get('KUBE_IN_CLUSTER', None)
+# node client running on, expose it by downward api ``spec.nodeName``, or looked up from own pod
+KUBE_NODE_NAME = os.environ.get('KUBE_NODE_NAME', None)
+# node label endpoints in the same zone are preferred by
+KUBE_TOPOLOGY_ZONE_LABEL = 'topology.kubernetes.io/zone'
+
 # client access token
 KUBE_AUTH_TOKEN = os.environ.get("KUBE_AUTH_TOKEN", None)
 
 # base image path used build mlflow model image
 MLFLOW_MODEL_BASE_IMAGE_PATH = os.path.join(os.path.dirname(__file__), 'deployments', 'dockerfile')
 MLFLOW_MODEL_BASE_IMAGE_DOCKERFILE = 'mlflow.dockerfile'
+# how model images are built, ``docker`` by local docker daemon, ``oci`` daemonless on top of
+# serving base image in registry
+MLFLOW_MODEL_IMAGE_BUILDER = os.environ.get('MLFLOW_MODEL_IMAGE_BUILDER', 'docker')
+# generic mlflow serving image in registry namespace which ``oci`` builder puts models on
+MLFLOW_MODEL_OCI_BASE_IMAGE = os.environ.get('MLFLOW_MODEL_OCI_BASE_IMAGE', 'mlflow-serving:latest')
+# access docker registry by http instead of https
+DOCKER_REGISTRY_INSECURE = os.environ.get('DOCKER_REGISTRY_INSECURE', '').lower() in ('1', 'true', 'yes')
 
 # mlflow models published uri
-MODELS_EVENT_URI = os.environ.get('MODELS_EVENT_URI', None)
\ No newline at end of file
+MODELS_EVENT_URI = os.environ.get('MODELS_EVENT_URI', None)
+# events handled concurrently by asyncio message bus
+MODELS_EVENT_MAX_IN_FLIGHT = int(os.environ.get('MODELS_EVENT_MAX_IN_FLIGHT', 8))
+
+# pre-pull new model images onto nodes before creating the deployment
+KUBE_PREPULL_IMAGE = os.environ.get('KUBE_PREPULL_IMAGE', '').lower() in ('1', 'true', 'yes')
+# seconds to wait for every node to finish pulling before giving up
+KUBE_PREPULL_TIMEOUT = int(os.environ.get('KUBE_PREPULL_TIMEOUT', 600))
+# tiny image keeps pre-pull pods alive after the model image was pulled
+KUBE_PREPULL_PAUSE_IMAGE = os.environ.get('KUBE_PREPULL_PAUSE_IMAGE', 'registry.k8s.io/pause:3.9')
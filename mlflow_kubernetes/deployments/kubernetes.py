@@ -1,4 +1,7 @@
+import os
 import re
+import time
+from collections import namedtuple
 
 from kubernetes import client
 from kubernetes import config as kube_config
@@ -8,17 +11,51 @@ from mlflow.exceptions import MlflowException
 from mlflow_kubernetes import logger
 # not import variables directly, as we expects users will change them
 from mlflow_kubernetes import config
+from mlflow_kubernetes.deployments import microbatch
 from mlflow_kubernetes.deployments.model_registry import DockerModelImageRegistry
+from mlflow_kubernetes.deployments.oci_builder import OCIModelImageBuilder
 
 canonical_name_pattern = re.compile(r"[a-zA-Z0-9\-.]+")
 
+IMAGE_BUILDERS = {
+    'docker': DockerModelImageRegistry,
+    'oci': OCIModelImageBuilder,
+}
+
+# seconds between two polls of pre-pull daemonset status
+PREPULL_POLL_INTERVAL = 2
+
+# max_batch_size: rows predicted together at most
+# max_latency_ms: milliseconds a request waits for others at most
+MicroBatchingOptions = namedtuple('MicroBatchingOptions', 'max_batch_size max_latency_ms')
+
+MICROBATCH_MOUNT_PATH = '/opt/mlflow-kubernetes'
+MICROBATCH_SCRIPT = os.path.basename(microbatch.__file__)
+
 
 class KubernetesDeployment:
-    def __init__(self, docker_registry_uri, kube_config_path=None) -> None:
+    def __init__(self, docker_registry_uri, kube_config_path=None, prepull=None, image_builder=None,
+                 micro_batching=None) -> None:
+        """
+        :param prepull: pull new model images on all nodes before creating deployment,
+                        default to ``config.KUBE_PREPULL_IMAGE``
+        :param image_builder: ``docker`` or ``oci``, default to ``config.MLFLOW_MODEL_IMAGE_BUILDER``
+        :param micro_batching: :py:class:`MicroBatchingOptions` of sidecar batching requests to models,
+                               default from ``config.KUBE_MICROBATCH_MAX_BATCH_SIZE``, disabled if 0
+        """
+        if micro_batching is None and config.KUBE_MICROBATCH_MAX_BATCH_SIZE > 0:
+            micro_batching = MicroBatchingOptions(config.KUBE_MICROBATCH_MAX_BATCH_SIZE,
+                                                  config.KUBE_MICROBATCH_MAX_LATENCY_MS)
+        self._micro_batching = micro_batching
+        image_builder = image_builder or config.MLFLOW_MODEL_IMAGE_BUILDER
+        if image_builder not in IMAGE_BUILDERS:
+            raise ValueError('image builder {} not in {}'.format(image_builder, list(IMAGE_BUILDERS)))
+        self._image_builder = IMAGE_BUILDERS[image_builder]
         kube_config.load_kube_config(config_file=kube_config_path)
         self._core_api = client.CoreV1Api()
         self._apps_api = client.AppsV1Api()
         self._docker_registry_uri = docker_registry_uri
+        self._prepull = config.KUBE_PREPULL_IMAGE if prepull is None else prepull
 
     def create_deployment(self, name, version, model_uri):
         """
@@ -43,9 +80,12 @@ class KubernetesDeployment:
 
         if self.get_deployment(canonical_name_version):
             raise MlflowException('service {} already exists'.format(canonical_name))
-        docker_registry = DockerModelImageRegistry(canonical_name, self._docker_registry_uri, version)
+        docker_registry = self._image_builder(canonical_name, self._docker_registry_uri, version)
         docker_registry.create_image_from_uri(model_uri)
-        self.create_kube_deployment_with_service(canonical_name_version, docker_registry.image_name)
+        if self._prepull:
+            self.prepull_image(canonical_name_version, docker_registry.image_name)
+        self.create_kube_deployment_with_service(canonical_name_version, docker_registry.image_name,
+                                                 micro_batching=self._micro_batching)
 
     def get_deployment(self, name):
         try:
@@ -55,23 +95,36 @@ class KubernetesDeployment:
                 return None
             raise
 
-    def create_deployment_object(self, name, image_tag):
+    def create_deployment_object(self, name, image_tag, micro_batching=None):
+        """
+        :param micro_batching: :py:class:`MicroBatchingOptions`, if given a sidecar batches
+                               concurrent requests before they reach model, service port
+                               named *name* points to sidecar instead.
+        """
         # Configureate Pod template container
         container = client.V1Container(
             name=name,
             image=image_tag,
-            ports=[client.V1ContainerPort(container_port=config.MLFLOW_MODEL_DEFAULT_TARGET_PORT, name=name)],
+            ports=[client.V1ContainerPort(container_port=config.MLFLOW_MODEL_DEFAULT_TARGET_PORT,
+                                          name='model' if micro_batching else name)],
             resources=client.V1ResourceRequirements(
                 requests={"cpu": "100m", "memory": "200Mi"},
             )
         )
+        containers, volumes = [container], None
+        if micro_batching:
+            containers.append(self.create_microbatch_container(name, micro_batching))
+            volumes = [client.V1Volume(
+                name='microbatch',
+                config_map=client.V1ConfigMapVolumeSource(name=self._microbatch_config_map_name(name)),
+            )]
         # Create and configurate a spec section
         # !! need create a secret with type docker-registry contains private registry credential
         secret = client.V1LocalObjectReference(name='regcred')
         template = client.V1PodTemplateSpec(
             metadata=client.V1ObjectMeta(labels={"name": name}),
             spec=client.V1PodSpec(
-                containers=[container], image_pull_secrets=[secret],
+                containers=containers, image_pull_secrets=[secret], volumes=volumes,
             ),
         )
         # Create the specification of deployment
@@ -88,8 +141,48 @@ class KubernetesDeployment:
 
         return deployment
 
-    def create_kube_deployment_with_service(self, name, image):
-        deployment_obj = self.create_deployment_object(name=name, image_tag=image)
+    def create_microbatch_container(self, name, micro_batching):
+        return client.V1Container(
+            name='microbatch',
+            image=config.KUBE_MICROBATCH_IMAGE,
+            command=[
+                'python', '{}/{}'.format(MICROBATCH_MOUNT_PATH, MICROBATCH_SCRIPT),
+                '--port', str(config.KUBE_MICROBATCH_PORT),
+                '--upstream', 'http://127.0.0.1:{}'.format(config.MLFLOW_MODEL_DEFAULT_TARGET_PORT),
+                '--max-batch-size', str(micro_batching.max_batch_size),
+                '--max-latency-ms', str(micro_batching.max_latency_ms),
+            ],
+            ports=[client.V1ContainerPort(container_port=config.KUBE_MICROBATCH_PORT, name=name)],
+            volume_mounts=[client.V1VolumeMount(name='microbatch', mount_path=MICROBATCH_MOUNT_PATH, read_only=True)],
+            resources=client.V1ResourceRequirements(
+                requests={"cpu": "50m", "memory": "32Mi"},
+            )
+        )
+
+    @staticmethod
+    def _microbatch_config_map_name(name):
+        return '{}-microbatch'.format(name)
+
+    def create_microbatch_config_map(self, name):
+        """
+        config map holds micro-batching proxy script mounted into sidecar
+        """
+        with open(microbatch.__file__) as f:
+            source = f.read()
+        config_map = client.V1ConfigMap(
+            api_version='v1',
+            kind='ConfigMap',
+            metadata=client.V1ObjectMeta(name=self._microbatch_config_map_name(name)),
+            data={MICROBATCH_SCRIPT: source},
+        )
+        return self._core_api.create_namespaced_config_map(
+            namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE, body=config_map
+        )
+
+    def create_kube_deployment_with_service(self, name, image, micro_batching=None):
+        if micro_batching:
+            self.create_microbatch_config_map(name)
+        deployment_obj = self.create_deployment_object(name=name, image_tag=image, micro_batching=micro_batching)
         logger.logger.info('create deployment:%s', deployment_obj)
         deployment_response = self._apps_api.create_namespaced_deployment(
             body=deployment_obj,
@@ -98,6 +191,117 @@ class KubernetesDeployment:
         service_response = self.create_kube_service(name)
         return deployment_response, service_response
 
+    def create_prepull_daemonset_object(self, name, image_tag):
+        """
+        daemonset pulls *image_tag* on every node by an init container which exits at once,
+        the pause container only keeps pod ready so pulling progress can be tracked.
+        """
+        puller = client.V1Container(
+            name='prepull',
+            image=image_tag,
+            image_pull_policy='IfNotPresent',
+            command=['/bin/sh', '-c', 'true'],
+        )
+        pause = client.V1Container(
+            name='pause',
+            image=config.KUBE_PREPULL_PAUSE_IMAGE,
+            resources=client.V1ResourceRequirements(
+                requests={"cpu": "1m", "memory": "8Mi"},
+            )
+        )
+        secret = client.V1LocalObjectReference(name='regcred')
+        template = client.V1PodTemplateSpec(
+            metadata=client.V1ObjectMeta(labels={"prepull": name}),
+            spec=client.V1PodSpec(
+                init_containers=[puller], containers=[pause],
+                image_pull_secrets=[secret], termination_grace_period_seconds=0,
+            ),
+        )
+        spec = client.V1DaemonSetSpec(
+            template=template,
+            selector={'matchLabels': {'prepull': name}})
+
+        return client.V1DaemonSet(
+            api_version="apps/v1",
+            kind="DaemonSet",
+            metadata=client.V1ObjectMeta(name=name),
+            spec=spec)
+
+    def prepull_image(self, name, image, timeout=None):
+        """
+        pull *image* onto all nodes through a short-lived daemonset before deployment created,
+        so the rollout and later scale-ups start from a node-local image instead of waiting on
+        registry bandwidth.
+
+        pre-pulling is only an optimization, deployment still goes on if it times out or
+        kubernetes refuses the daemonset.
+
+        :param name: deployment name the image belongs to
+        :param image: image pushed to registry
+        :param timeout: seconds to wait for all nodes, default to ``config.KUBE_PREPULL_TIMEOUT``
+        :return: seconds spent pulling, pods created afterwards don't pay it again.
+                 None if not all nodes finished in time or pre-pulling failed
+        """
+        timeout = timeout or config.KUBE_PREPULL_TIMEOUT
+        daemonset_name = '{}-prepull'.format(name)
+        start = time.monotonic()
+        try:
+            self._apps_api.create_namespaced_daemon_set(
+                namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE,
+                body=self.create_prepull_daemonset_object(daemonset_name, image)
+            )
+            ready, desired = self._wait_for_daemonset_ready(daemonset_name, start + timeout)
+        except client.rest.ApiException as e:
+            # no permission on daemonsets, or one left over by an interrupted deployment
+            logger.logger.warning('pre-pull image %s failed, deploy without it: %s %s', image, e.status, e.reason)
+            return None
+        finally:
+            try:
+                self._delete_daemonset(daemonset_name)
+            except client.rest.ApiException as e:
+                logger.logger.warning('pre-pull daemonset %s not deleted: %s %s', daemonset_name, e.status, e.reason)
+        elapsed = time.monotonic() - start
+
+        if ready < desired:
+            logger.logger.warning('pre-pull image %s timeout after %.1fs, %s/%s nodes pulled',
+                                  image, elapsed, ready, desired)
+            return None
+
+        logger.logger.info('pre-pulled image %s on %s nodes in %.1fs, saved from deployment rollout',
+                           image, ready, elapsed)
+        return elapsed
+
+    def _wait_for_daemonset_ready(self, name, deadline):
+        """
+        wait until every scheduled pod of daemonset is ready or *deadline* reached
+        :return: tuple of ready and desired pod numbers
+        """
+        ready = desired = 0
+        while True:
+            daemonset = self._apps_api.read_namespaced_daemon_set_status(
+                name=name, namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE
+            )
+            status = daemonset.status
+            ready = status.number_ready or 0
+            desired = status.desired_number_scheduled or 0
+            # status is stale until controller observed the daemonset
+            observed = (status.observed_generation or 0) >= (daemonset.metadata.generation or 0)
+            if observed and ready >= desired:
+                return ready, desired
+            if time.monotonic() >= deadline:
+                return ready, desired
+            time.sleep(PREPULL_POLL_INTERVAL)
+
+    def _delete_daemonset(self, name):
+        try:
+            self._apps_api.delete_namespaced_daemon_set(
+                name=name, namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE,
+                body=client.V1DeleteOptions(propagation_policy="Background", grace_period_seconds=0)
+            )
+        except client.rest.ApiException as e:
+            if e.status != 404:
+                raise
+
     def create_kube_service(self, name):
         service = client.V1Service()
         service.api_version = "v1"
@@ -128,6 +332,14 @@ class KubernetesDeployment:
             if e.status != 404:
                 raise
 
+        try:
+            self._core_api.delete_namespaced_config_map(
+                name=self._microbatch_config_map_name(name), namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE
+            )
+        except client.rest.ApiException as e:
+            if e.status != 404:
+                raise
+
     def list_deployments(self):
         return self._apps_api.list_namespaced_deployment(namespace=config.KUBE_MLLFOW_MODELS_NAMESPACE)
 
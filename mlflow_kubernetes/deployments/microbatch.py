@@ -0,0 +1,310 @@
+"""
+micro-batching proxy running as sidecar of model pods.
+
+concurrent ``/invocations`` requests in pandas *split* json format are held for a short
+window, concatenated to one request to the model scoring server and the predictions split
+back to each caller, so many single row requests pay only one pyfunc ``predict`` call.
+requests in other formats are forwarded as they are.
+
+the window adapts to traffic: it shrinks when requests arrive alone, so sparse traffic
+doesn't wait for nothing, and grows back up to ``--max-latency-ms`` when batches form.
+
+only standard library is used, the file is mounted into sidecar container and run as::
+
+    python microbatch.py --port 8081 --upstream http://127.0.0.1:8080 \\
+        --max-batch-size 64 --max-latency-ms 5
+"""
+import argparse
+import http.client
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('mlflow_kubernetes.microbatch')
+
+# shortest batching window before it is dropped to zero
+MIN_WINDOW = 0.0005
+
+
+class UpstreamError(Exception):
+
+    def __init__(self, status, body, content_type):
+        super(UpstreamError, self).__init__(status)
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+
+
+class Upstream:
+    """
+    keep-alive connections to model scoring server, one for each thread
+    """
+
+    def __init__(self, url, timeout=60):
+        parsed = urllib.parse.urlparse(url)
+        self._host = parsed.hostname
+        self._port = parsed.port or 80
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        :return: tuple of status, body and content type
+        """
+        for retry in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                return resp.status, resp.read(), resp.getheader('Content-Type', 'application/json')
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+                # connection kept alive may be closed by server, retry once with a new one
+                if retry:
+                    raise
+
+
+class _Pending:
+    __slots__ = ('columns', 'rows', 'result', 'error', 'done')
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _split_predictions(response, sizes):
+    """
+    split predictions of concatenated rows back by *sizes*, scoring server returns a list,
+    or a dict with ``predictions`` list in newer mlflow
+    """
+    wrapped = isinstance(response, dict)
+    predictions = response['predictions'] if wrapped else response
+    if not isinstance(predictions, list) or len(predictions) != sum(sizes):
+        raise ValueError('predictions not one per row, can not split')
+
+    parts, start = [], 0
+    for size in sizes:
+        part = predictions[start:start + size]
+        parts.append({'predictions': part} if wrapped else part)
+        start += size
+    return parts
+
+
+class MicroBatcher:
+    """
+    collect rows submitted concurrently, predict them in one upstream request
+
+    :param predict: function of ``(columns, rows)`` returns predictions response
+    :param max_batch_size: rows in one batch at most, only a single larger request is predicted alone
+    :param max_latency: seconds a request waits for others at most
+    :param workers: batches predicted at the same time, next batch is collected meanwhile
+    """
+
+    def __init__(self, predict, max_batch_size=64, max_latency=0.005, workers=2):
+        self._predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._window = max_latency
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, name='microbatch-{}'.format(i), daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, columns, rows):
+        """
+        wait until rows predicted together with others
+
+        :return: predictions response of these rows only
+        """
+        pending = _Pending(columns, rows)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self, batch):
+        """
+        fill *batch* owned by caller, so items already taken are known even if it fails
+        """
+        batch.append(self._queue.get())
+        size = len(batch[0].rows)
+        with self._lock:
+            deadline = time.monotonic() + self._window
+
+        while size < self.max_batch_size:
+            try:
+                # take what already arrived, then wait the rest of window
+                timeout = deadline - time.monotonic()
+                item = self._queue.get_nowait() if timeout <= 0 else self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if size + len(item.rows) > self.max_batch_size:
+                # would cross the cap, item starts a later batch instead
+                self._queue.put(item)
+                break
+            batch.append(item)
+            size += len(item.rows)
+
+        with self._lock:
+            if len(batch) == 1:
+                self._window = self._window / 2 if self._window / 2 >= MIN_WINDOW else 0.0
+            else:
+                self._window = min(self.max_latency, max(self._window * 2, MIN_WINDOW))
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                self._collect(batch)
+                groups = {}
+                for item in batch:
+                    groups.setdefault(tuple(item.columns), []).append(item)
+                for columns, items in groups.items():
+                    self._predict_group(list(columns), items)
+            except Exception as e:
+                # worker must survive, otherwise requests queued later are never answered
+                logger.exception('micro batch failed')
+                for item in batch:
+                    if not item.done.is_set():
+                        self._finish(item, error=e)
+
+    def _predict_group(self, columns, items):
+        try:
+            response = self._predict(columns, [row for item in items for row in item.rows])
+            # a request alone gets whatever server returned, even not one prediction per row
+            parts = [response] if len(items) == 1 else _split_predictions(response, [len(item.rows) for item in items])
+        except Exception as e:
+            if len(items) == 1:
+                return self._finish(items[0], error=e)
+            # one bad request should not fail others, predict them one by one
+            for item in items:
+                self._predict_group(columns, [item])
+            return
+
+        for item, part in zip(items, parts):
+            self._finish(item, result=part)
+
+    @staticmethod
+    def _finish(item, result=None, error=None):
+        item.result = result
+        item.error = error
+        item.done.set()
+
+
+def _is_split_payload(payload):
+    """
+    pandas *split* payload rows can be concatenated with others: flat string columns and
+    data as list of rows, anything else goes to scoring server as it is
+    """
+    if not isinstance(payload, dict) or set(payload) - {'columns', 'data', 'index'} \
+            or 'columns' not in payload or 'data' not in payload:
+        return False
+    columns, data = payload['columns'], payload['data']
+    return isinstance(columns, list) and all(isinstance(column, str) for column in columns) \
+        and isinstance(data, list) and all(isinstance(row, list) for row in data)
+
+
+class MicroBatchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, don't let them wait for delayed ack
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def _reply(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _forward(self, body=None):
+        headers = {'Content-Type': self.headers.get('Content-Type', 'application/json')} if body is not None else {}
+        try:
+            status, data, content_type = self.server.upstream.request(self.command, self.path, body, headers)
+        except (http.client.HTTPException, OSError) as e:
+            return self._reply(502, json.dumps({'error': str(e)}).encode())
+        self._reply(status, data, content_type)
+
+    def do_GET(self):
+        self._forward()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        content_type = self.headers.get('Content-Type', 'application/json')
+        if self.path != '/invocations' or not content_type.startswith('application/json') \
+                or 'records' in content_type:
+            return self._forward(body)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._forward(body)
+        if not _is_split_payload(payload):
+            return self._forward(body)
+
+        try:
+            result = self.server.batcher.submit(payload['columns'], payload['data'])
+        except UpstreamError as e:
+            return self._reply(e.status, e.body, e.content_type)
+        except Exception as e:
+            return self._reply(502, json.dumps({'error': str(e)}).encode())
+        self._reply(200, json.dumps(result).encode())
+
+
+class MicroBatchServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # concurrent callers are the point of batching, default backlog of 5 resets their connections
+    request_queue_size = 128
+
+    def __init__(self, address, upstream_url, max_batch_size=64, max_latency=0.005, workers=2):
+        super(MicroBatchServer, self).__init__(address, MicroBatchHandler)
+        self.upstream = Upstream(upstream_url)
+        self.batcher = MicroBatcher(self._predict, max_batch_size=max_batch_size,
+                                    max_latency=max_latency, workers=workers)
+
+    def _predict(self, columns, rows):
+        body = json.dumps({'columns': columns, 'data': rows}).encode()
+        status, data, content_type = self.upstream.request(
+            'POST', '/invocations', body, {'Content-Type': 'application/json; format=pandas-split'}
+        )
+        if status != 200:
+            raise UpstreamError(status, data, content_type)
+        return json.loads(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='micro-batching proxy of mlflow scoring server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--upstream', default='http://127.0.0.1:8080', help='model scoring server url')
+    parser.add_argument('--max-batch-size', type=int, default=64, help='rows predicted together at most')
+    parser.add_argument('--max-latency-ms', type=float, default=5, help='milliseconds waiting for a batch at most')
+    parser.add_argument('--workers', type=int, default=2, help='batches predicted concurrently')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = MicroBatchServer((args.host, args.port), args.upstream, max_batch_size=args.max_batch_size,
+                              max_latency=args.max_latency_ms / 1000, workers=args.workers)
+    logger.info('micro-batching %s on port %s', args.upstream, args.port)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+"""
+build model images without docker daemon.
+
+model directory is packed as one layer on top of a generic mlflow serving base image
+already in the registry, the image is assembled as an OCI image layout and pushed by
+registry http api v2. blobs are pushed concurrently, blobs registry already has are
+skipped and base image layers are mounted across repositories instead of uploaded again,
+so several images can be built at the same time on one server.
+
+the base image serves model under ``/opt/ml/model`` and install its dependencies at start,
+like the one built by ``mlflow models build-docker`` without model uri.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tarfile
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from mlflow_kubernetes import config
+from mlflow_kubernetes.deployments.model_registry import get_docker_registry_info, \
+    _generate_normal_name_for_repositry
+from mlflow_kubernetes.logger import logger
+
+MODEL_PATH_IN_IMAGE = 'opt/ml/model'
+
+OCI_MANIFEST = 'application/vnd.oci.image.manifest.v1+json'
+OCI_INDEX = 'application/vnd.oci.image.index.v1+json'
+OCI_CONFIG = 'application/vnd.oci.image.config.v1+json'
+OCI_LAYER = 'application/vnd.oci.image.layer.v1.tar+gzip'
+DOCKER_MANIFEST = 'application/vnd.docker.distribution.manifest.v2+json'
+DOCKER_MANIFEST_LIST = 'application/vnd.docker.distribution.manifest.list.v2+json'
+DOCKER_CONFIG = 'application/vnd.docker.container.image.v1+json'
+DOCKER_LAYER = 'application/vnd.docker.image.rootfs.diff.tar.gzip'
+
+# layer and config media types used along with manifest media type
+MEDIA_TYPES = {
+    OCI_MANIFEST: (OCI_CONFIG, OCI_LAYER),
+    DOCKER_MANIFEST: (DOCKER_CONFIG, DOCKER_LAYER),
+}
+
+# bytes read each time streaming blobs
+CHUNK_SIZE = 1024 * 1024
+
+
+def _digest(data: bytes):
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+class _HashingWriter:
+    """write through to *fileobj*, hashing and counting bytes written"""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._fileobj.write(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+    @property
+    def digest(self):
+        return 'sha256:' + self._hash.hexdigest()
+
+
+def _reset_tarinfo(tarinfo):
+    # reproducible layer, same model directory always gets the same digest
+    tarinfo.mtime = 0
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = 'root'
+    return tarinfo
+
+
+def build_layer(src_dir, dest_path, arcname=MODEL_PATH_IN_IMAGE):
+    """
+    pack *src_dir* as a gzip layer tarball placed at *arcname* in image
+
+    :return: tuple of compressed digest, size and uncompressed digest (diff id)
+    """
+    with open(dest_path, 'wb') as f:
+        compressed = _HashingWriter(f)
+        with gzip.GzipFile(fileobj=compressed, mode='wb', mtime=0) as gz:
+            uncompressed = _HashingWriter(gz)
+            with tarfile.open(fileobj=uncompressed, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                parts = arcname.split('/')
+                for i in range(1, len(parts)):
+                    parent = tarfile.TarInfo('/'.join(parts[:i]))
+                    parent.type, parent.mode = tarfile.DIRTYPE, 0o755
+                    tar.addfile(_reset_tarinfo(parent))
+                for root, dirs, files in os.walk(src_dir):
+                    dirs.sort()
+                    rel = os.path.relpath(root, src_dir)
+                    name = arcname if rel == '.' else '{}/{}'.format(arcname, rel.replace(os.sep, '/'))
+                    tar.add(root, arcname=name, recursive=False, filter=_reset_tarinfo)
+                    for filename in sorted(files):
+                        tar.add(os.path.join(root, filename), arcname='{}/{}'.format(name, filename),
+                                filter=_reset_tarinfo)
+    return compressed.digest, compressed.size, uncompressed.digest
+
+
+class RegistryClient:
+    """
+    minimal docker registry http api v2 client, supports basic and bearer token auth
+
+    :param registry: registry host with optional port
+    :param insecure: use http instead of https
+    """
+
+    def __init__(self, registry, username=None, password=None, insecure=False, max_connections=16):
+        import requests
+        import requests.adapters
+
+        self._base_url = '{}://{}'.format('http' if insecure else 'https', registry)
+        self._credential = (username, password) if username else None
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_connections)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        # bearer tokens cached by scope
+        self._tokens = {}
+
+    def _url(self, path):
+        return urllib.parse.urljoin(self._base_url, path)
+
+    def _request(self, method, url, scope, **kwargs):
+        headers = kwargs.pop('headers', {})
+        for retry in range(2):
+            if scope in self._tokens:
+                headers['Authorization'] = 'Bearer ' + self._tokens[scope]
+            resp = self._session.request(method, url, headers=headers,
+                                         auth=None if scope in self._tokens else self._credential, **kwargs)
+            if resp.status_code != 401 or retry:
+                return resp
+            challenge = resp.headers.get('WWW-Authenticate', '')
+            if not challenge.lower().startswith('bearer '):
+                return resp
+            self._tokens[scope] = self._fetch_token(challenge)
+            # rewind streamed upload before retry
+            data = kwargs.get('data')
+            if hasattr(data, 'seek'):
+                data.seek(0)
+        return resp
+
+    def _fetch_token(self, challenge):
+        params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+        realm = params.pop('realm')
+        resp = self._session.get(realm, params=params, auth=self._credential)
+        resp.raise_for_status()
+        body = resp.json()
+        return body.get('token') or body['access_token']
+
+    def get_manifest(self, repository, reference, platform=('linux', 'amd64')):
+        """
+        :return: tuple of manifest, its media type and digest. image index is resolved to
+                 manifest of *platform*
+        """
+        scope = 'repository:{}:pull'.format(repository)
+        accept = ', '.join([OCI_MANIFEST, DOCKER_MANIFEST, OCI_INDEX, DOCKER_MANIFEST_LIST])
+        resp = self._request('GET', self._url('/v2/{}/manifests/{}'.format(repository, reference)),
+                             scope, headers={'Accept': accept})
+        resp.raise_for_status()
+        manifest = resp.json()
+        media_type = manifest.get('mediaType') or resp.headers.get('Content-Type', OCI_MANIFEST)
+
+        if media_type in (OCI_INDEX, DOCKER_MANIFEST_LIST):
+            for candidate in manifest['manifests']:
+                p = candidate.get('platform', {})
+                if (p.get('os'), p.get('architecture')) == platform:
+                    return self.get_manifest(repository, candidate['digest'], platform)
+            raise RuntimeError('no {}/{} image in {}:{}'.format(*platform, repository, reference))
+
+        return manifest, media_type, resp.headers.get('Docker-Content-Digest') or _digest(resp.content)
+
+    def get_blob(self, repository, digest, dest_path):
+        resp = self._request('GET', self._url('/v2/{}/blobs/{}'.format(repository, digest)),
+                             'repository:{}:pull'.format(repository), stream=True)
+        resp.raise_for_status()
+        with open(dest_path, 'wb') as f:
+            for chunk in resp.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+
+    def blob_exists(self, repository, digest):
+        resp = self._request('HEAD', self._url('/v2/{}/blobs/{}'.format(repository, digest)),
+                             'repository:{}:pull'.format(repository))
+        return resp.status_code == 200
+
+    def mount_blob(self, repository, digest, from_repository):
+        """
+        cross repository blob mount, return False if registry refused it
+        """
+        scope = 'repository:{}:pull,push repository:{}:pull'.format(repository, from_repository)
+        resp = self._request('POST', self._url('/v2/{}/blobs/uploads/'.format(repository)), scope,
+                             params={'mount': digest, 'from': from_repository})
+        if resp.status_code == 201:
+            return True
+        if resp.status_code == 202:
+            # registry started a normal upload instead, not used
+            self._request('DELETE', self._url(resp.headers['Location']), scope)
+            return False
+        resp.raise_for_status()
+        return False
+
+    def upload_blob(self, repository, digest, path):
+        """monolithic upload of blob in *path*"""
+        scope = 'repository:{}:pull,push'.format(repository)
+        resp = self._request('POST', self._url('/v2/{}/blobs/uploads/'.format(repository)), scope)
+        resp.raise_for_status()
+        location = self._url(resp.headers['Location'])
+        separator = '&' if '?' in location else '?'
+        with open(path, 'rb') as f:
+            resp = self._request('PUT', '{}{}digest={}'.format(location, separator, urllib.parse.quote(digest)),
+                                 scope, data=f, headers={'Content-Type': 'application/octet-stream'})
+        resp.raise_for_status()
+
+    def put_manifest(self, repository, reference, manifest: bytes, media_type):
+        resp = self._request('PUT', self._url('/v2/{}/manifests/{}'.format(repository, reference)),
+                             'repository:{}:pull,push'.format(repository),
+                             data=manifest, headers={'Content-Type': media_type})
+        resp.raise_for_status()
+        return resp.headers.get('Docker-Content-Digest') or _digest(manifest)
+
+
+def _split_repository(image_name, registry):
+    """
+    ``registry/namespace/name:tag`` to ``(namespace/name, tag)``
+    """
+    repository = image_name[len(registry) + 1:] if image_name.startswith(registry + '/') else image_name
+    name, sep, tag = repository.rpartition(':')
+    if not sep or '/' in tag:
+        return repository, 'latest'
+    return name, tag
+
+
+class OCIModelImageBuilder:
+    """
+    drop-in replacement of :py:class:`DockerModelImageRegistry` which doesn't need docker daemon.
+    create a image from mlflow model uri on top of base image in the same registry, push it.
+    """
+
+    def __init__(self, image_name, registry_uri, image_tag='latest', base_image=None, max_workers=8):
+        """
+        :param base_image: serving base image name in registry namespace, like ``mlflow-serving:latest``,
+                           default to ``config.MLFLOW_MODEL_OCI_BASE_IMAGE``
+        :param max_workers: blobs pushed concurrently
+        """
+        self.registry_info = get_docker_registry_info(registry_uri)
+        self._image_name = image_name
+        self._image_tag = image_tag
+        self._base_image = base_image or config.MLFLOW_MODEL_OCI_BASE_IMAGE
+        self._max_workers = max_workers
+        self._client = None
+        self._layout_dir = None
+        self._base_repository = None
+        self._base_layers = set()
+
+    @property
+    def image_name(self):
+        """canonical image name """
+        return _generate_normal_name_for_repositry(self._image_name, self.registry_info, self._image_tag)
+
+    @property
+    def client(self) -> RegistryClient:
+        if self._client is None:
+            registry = self.registry_info.registry
+            insecure = config.DOCKER_REGISTRY_INSECURE or registry.split(':')[0] in ('localhost', '127.0.0.1')
+            self._client = RegistryClient(
+                registry, self.registry_info.username, self.registry_info.password,
+                insecure=insecure, max_connections=self._max_workers
+            )
+        return self._client
+
+    def create_image_from_uri(self, uri, oci_archive=None, **kwargs):
+        """
+        download model from uri, build image and push it to registry
+
+        :param oci_archive: also save the OCI image layout as tarball to this path, base image
+                            layers are fetched into it, so it is a complete image
+        :return: pushed manifest digest
+        """
+        from mlflow.store.artifact.models_artifact_repo import ModelsArtifactRepository
+        from mlflow.tracking.artifact_utils import _download_artifact_from_uri
+
+        if ModelsArtifactRepository.is_models_uri(uri):
+            uri = ModelsArtifactRepository.get_underlying_uri(uri)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, 'model')
+            os.makedirs(output_path)
+            model_dir = _download_artifact_from_uri(uri, output_path=output_path)
+            return self.build_image_from_directory(model_dir, oci_archive=oci_archive)
+
+    def build_image_from_directory(self, model_dir, oci_archive=None):
+        with tempfile.TemporaryDirectory() as layout_dir:
+            self._layout_dir = layout_dir
+            try:
+                self.build_oci_layout(model_dir, layout_dir)
+                if oci_archive:
+                    self._fetch_base_layers()
+                    with tarfile.open(oci_archive, 'w') as tar:
+                        tar.add(layout_dir, arcname='.')
+                return self.push_image_to_repository()
+            finally:
+                self._layout_dir = None
+
+    def _fetch_base_layers(self):
+        """
+        download base image layers into layout, which are only referenced by digest otherwise
+        """
+        missing = [digest for digest in self._base_layers if not os.path.exists(self._blob_path(digest))]
+        with ThreadPoolExecutor(max_workers=self._max_workers) as pool:
+            list(pool.map(lambda digest: self.client.get_blob(self._base_repository, digest, self._blob_path(digest)),
+                          missing))
+
+    def _blob_path(self, digest, layout_dir=None):
+        algorithm, hexdigest = digest.split(':', 1)
+        return os.path.join(layout_dir or self._layout_dir, 'blobs', algorithm, hexdigest)
+
+    def build_oci_layout(self, model_dir, layout_dir):
+        """
+        assemble image as OCI image layout in *layout_dir*, which contains model layer,
+        image config and manifest. base image layers are only referenced by digest, they are
+        fetched into layout only when it is archived.
+        """
+        blobs_dir = os.path.join(layout_dir, 'blobs', 'sha256')
+        os.makedirs(blobs_dir, exist_ok=True)
+
+        base_name, _, base_tag = self._base_image.partition(':')
+        base_repository, base_tag = _split_repository(
+            _generate_normal_name_for_repositry(base_name, self.registry_info, base_tag or 'latest'),
+            self.registry_info.registry
+        )
+        self._base_repository = base_repository
+        base_manifest, media_type, _ = self.client.get_manifest(base_repository, base_tag)
+        if media_type not in MEDIA_TYPES:
+            raise TypeError('base image manifest type {} not supported'.format(media_type))
+        self._base_layers = {layer['digest'] for layer in base_manifest['layers']}
+        config_media_type, layer_media_type = MEDIA_TYPES[media_type]
+
+        layer_tmp = os.path.join(layout_dir, 'layer.tar.gz')
+        layer_digest, layer_size, diff_id = build_layer(model_dir, layer_tmp)
+        os.replace(layer_tmp, self._blob_path(layer_digest, layout_dir))
+        logger.info('model layer %s built, %s bytes', layer_digest, layer_size)
+
+        base_config_path = self._blob_path(base_manifest['config']['digest'], layout_dir)
+        self.client.get_blob(base_repository, base_manifest['config']['digest'], base_config_path)
+        with open(base_config_path) as f:
+            image_config = json.load(f)
+        os.remove(base_config_path)
+
+        image_config.setdefault('rootfs', {'type': 'layers', 'diff_ids': []})['diff_ids'].append(diff_id)
+        image_config.setdefault('history', []).append({
+            'created_by': 'mlflow-kubernetes: COPY model /{}'.format(MODEL_PATH_IN_IMAGE),
+        })
+        config_bytes = json.dumps(image_config, sort_keys=True, separators=(',', ':')).encode()
+        config_digest = _digest(config_bytes)
+        with open(self._blob_path(config_digest, layout_dir), 'wb') as f:
+            f.write(config_bytes)
+
+        manifest = {
+            'schemaVersion': 2,
+            'mediaType': media_type,
+            'config': {'mediaType': config_media_type, 'digest': config_digest, 'size': len(config_bytes)},
+            'layers': base_manifest['layers'] + [
+                {'mediaType': layer_media_type, 'digest': layer_digest, 'size': layer_size}
+            ],
+        }
+        manifest_bytes = json.dumps(manifest, sort_keys=True, separators=(',', ':')).encode()
+        manifest_digest = _digest(manifest_bytes)
+        with open(self._blob_path(manifest_digest, layout_dir), 'wb') as f:
+            f.write(manifest_bytes)
+
+        with open(os.path.join(layout_dir, 'oci-layout'), 'w') as f:
+            json.dump({'imageLayoutVersion': '1.0.0'}, f)
+        with open(os.path.join(layout_dir, 'index.json'), 'w') as f:
+            json.dump({'schemaVersion': 2, 'manifests': [{
+                'mediaType': media_type, 'digest': manifest_digest, 'size': len(manifest_bytes),
+                'annotations': {'org.opencontainers.image.ref.name': self.image_name},
+            }]}, f)
+        return manifest_digest
+
+    def _push_blob(self, repository, digest):
+        """
+        :return: how blob pushed: *exists*, *mounted* or *uploaded*
+        """
+        if self.client.blob_exists(repository, digest):
+            return 'exists'
+        path = self._blob_path(digest)
+        if digest in self._base_layers:
+            # let registry copy base layer, even it is fetched into layout already
+            if self.client.mount_blob(repository, digest, self._base_repository):
+                return 'mounted'
+            if not os.path.exists(path):
+                self.client.get_blob(self._base_repository, digest, path)
+        self.client.upload_blob(repository, digest, path)
+        return 'uploaded'
+
+    def push_image_to_repository(self):
+        """
+        push blobs of OCI layout built concurrently, then the manifest
+
+        :return: pushed manifest digest
+        """
+        logger.info("=== pushing image %s =========", self.image_name)
+        with open(os.path.join(self._layout_dir, 'index.json')) as f:
+            descriptor = json.load(f)['manifests'][0]
+        with open(self._blob_path(descriptor['digest']), 'rb') as f:
+            manifest_bytes = f.read()
+        manifest = json.loads(manifest_bytes)
+
+        repository, tag = _split_repository(self.image_name, self.registry_info.registry)
+        blobs = [manifest['config']['digest']] + [layer['digest'] for layer in manifest['layers']]
+        with ThreadPoolExecutor(max_workers=self._max_workers) as pool:
+            results = list(pool.map(lambda digest: self._push_blob(repository, digest), blobs))
+        logger.info('blobs of %s: %s', self.image_name,
+                    {state: results.count(state) for state in set(results)})
+
+        return self.client.put_manifest(repository, tag, manifest_bytes, descriptor['mediaType'])
@@ -0,0 +1,259 @@
+"""
+asyncio flavor of :py:class:`mlflow_kubernetes.entrypoints.messagebus.MessageBus`.
+
+handlers of the same topic are dispatched concurrently, coroutine handlers run in the
+event loop and blocking ones (kubernetes, docker) in an executor, so a slow deployment
+doesn't hold back other events. the listening loop can be interrupted at any time, which
+make graceful shutdown on SIGTERM possible.
+"""
+import abc
+import asyncio
+import json
+import signal
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Any
+
+from mlflow_kubernetes import config
+from mlflow_kubernetes.logger import logger
+
+# seconds waiting for in-flight handlers after stop requested
+SHUTDOWN_TIMEOUT = 30
+
+
+class AsyncMessageBus:
+    """
+    same interface as :py:class:`mlflow_kubernetes.entrypoints.messagebus.MessageBus`, but
+    :py:meth:`run`, :py:meth:`handle_event` and :py:meth:`dispatch_event` are coroutines.
+
+    at most *max_in_flight* events are handled at the same time, next message is fetched
+    only after one of them finished.
+    """
+
+    def __init__(self, *handlers, max_in_flight=None, executor=None):
+        """
+        :param handlers: topic handlers, ``handle`` can be a plain function or coroutine function
+        :param max_in_flight: events handled concurrently, default to ``config.MODELS_EVENT_MAX_IN_FLIGHT``
+        :param executor: executor blocking handlers run in, default to a thread pool owned by bus
+        """
+        self._handlers = defaultdict(set)
+        # topics registered but not subscribed yet, subscribing needs a running loop
+        self._unsubscribed = set()
+        self._max_in_flight = max_in_flight or config.MODELS_EVENT_MAX_IN_FLIGHT
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=self._max_in_flight, thread_name_prefix='messagebus'
+        )
+        self._tasks = set()
+        self._stopped = None
+
+        for handler in handlers:
+            self.register(handler)
+
+    def register(self, handler):
+        """
+        register new handler, its topics are subscribed before next message fetched
+        """
+        for topic in handler.topics:
+
+            if topic not in self._handlers:
+                self._unsubscribed.add(topic)
+            self._handlers[topic].add(handler)
+
+    async def run(self):
+        """
+        run until :py:meth:`stop` called or SIGINT/SIGTERM received, then wait for
+        in-flight events at most ``SHUTDOWN_TIMEOUT`` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        in_flight = asyncio.Semaphore(self._max_in_flight)
+        signals = self._install_signal_handlers(loop)
+
+        try:
+            while not self._stopped.is_set():
+                await self._subscribe_pending()
+                # take a slot before fetching, no message is fetched then left unhandled
+                if not await self._until_stopped(in_flight.acquire()):
+                    break
+                topic, message = await self._until_stopped(self.get_message()) or (None, None)
+                if message is None:
+                    in_flight.release()
+                    continue
+
+                task = loop.create_task(self._handle_event_release(topic, message, in_flight))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            for signum in signals:
+                loop.remove_signal_handler(signum)
+            await self._drain()
+            await self.close()
+
+    async def dispatch_event(self, topic, event):
+        """
+        outgoing event handle
+        """
+        await self._publish(topic, event)
+
+    async def handle_event(self, topic, event):
+        """
+        incoming event handle, all handlers of *topic* run concurrently. one handler
+        failed won't affect others
+        """
+        handlers = list(self._handlers[topic])
+        results = await asyncio.gather(
+            *(self._call_handler(handler, topic, event) for handler in handlers),
+            return_exceptions=True
+        )
+
+        for handler, messages in zip(handlers, results):
+            if isinstance(messages, Exception):
+                logger.error('handler %s failed on topic %s', handler, topic, exc_info=messages)
+            elif messages:
+                for out_topic, message in messages:
+                    await self.dispatch_event(out_topic, message)
+
+    async def _call_handler(self, handler, topic, event):
+        logger.info('handler %s handle %s with message:\n%s', handler, topic, event)
+        if asyncio.iscoroutinefunction(handler.handle):
+            return await handler.handle(topic, event)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, handler.handle, topic, event)
+
+    async def _handle_event_release(self, topic, event, in_flight):
+        try:
+            await self.handle_event(topic, event)
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            in_flight.release()
+
+    async def _until_stopped(self, awaitable):
+        """
+        wait for *awaitable* or stop, whichever comes first
+
+        :return: result of *awaitable*, None if it is cancelled as stop requested
+        """
+        task = asyncio.ensure_future(awaitable)
+        stop = asyncio.ensure_future(self._stopped.wait())
+        done, _ = await asyncio.wait({task, stop}, return_when=asyncio.FIRST_COMPLETED)
+        if task in done:
+            stop.cancel()
+            return task.result()
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return None
+
+    async def _subscribe_pending(self):
+        while self._unsubscribed:
+            topic = self._unsubscribed.pop()
+            await self._subsribe(topic)
+
+    async def _drain(self):
+        if self._tasks:
+            logger.info('waiting for %s in-flight events', len(self._tasks))
+            _, pending = await asyncio.wait(set(self._tasks), timeout=SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+    def _install_signal_handlers(self, loop):
+        installed = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # not in main thread or not supported by platform
+                continue
+            installed.append(signum)
+        return installed
+
+    def stop(self):
+        logger.info('stopping message bus')
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def close(self):
+        """
+        release backend resources after stopped
+        """
+
+    @abc.abstractmethod
+    async def get_message(self) -> Tuple[str, Any]:
+        """
+        get next message for topic, wait if no available event occurred
+        """
+
+    @abc.abstractmethod
+    async def _subsribe(self, topic):
+        pass
+
+    @abc.abstractmethod
+    async def _publish(self, topic, event):
+        pass
+
+
+class AsyncRedisMessageBus(AsyncMessageBus):
+
+    def __init__(self, host='localhost', port=6379, *handlers, **kwargs):
+        import redis.asyncio
+
+        self._redis = redis.asyncio.StrictRedis(
+            host=host, port=port, encoding='utf-8',
+            decode_responses=True
+        )
+        self._pub_sub = self._redis.pubsub(ignore_subscribe_messages=True)
+        super(AsyncRedisMessageBus, self).__init__(*handlers, **kwargs)
+
+    async def _subsribe(self, topic):
+        await self._pub_sub.subscribe(topic)
+
+    async def _publish(self, topic, event):
+        await self._redis.publish(topic, json.dumps(event))
+
+    async def get_message(self):
+        while True:
+            response = await self._pub_sub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if response and response['channel']:
+                return response['channel'], json.loads(response['data'])
+
+    async def close(self):
+        for conn in (self._pub_sub, self._redis):
+            # aclose replaced close since redis 5
+            close = getattr(conn, 'aclose', None) or conn.close
+            await close()
+
+
+class AsyncInMemoryMessageBus(AsyncMessageBus):
+    """
+    in-process counterpart of :py:class:`AsyncRedisMessageBus`, events are json encoded when
+    published and only delivered when topic subscribed.
+    """
+
+    def __init__(self, *handlers, **kwargs):
+        # created in running loop, queue binds to the loop current at creation before python 3.10
+        self._queue = None
+        self._subscribed = set()
+        super(AsyncInMemoryMessageBus, self).__init__(*handlers, **kwargs)
+
+    def _get_queue(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def _subsribe(self, topic):
+        self._subscribed.add(topic)
+
+    async def _publish(self, topic, event):
+        if topic in self._subscribed:
+            self._get_queue().put_nowait((topic, json.dumps(event)))
+
+    async def get_message(self):
+        topic, data = await self._get_queue().get()
+        return topic, json.loads(data)
@@ -1,10 +1,12 @@
+import asyncio
+import json
 import urllib.parse
 
 import click
 from mlflow_kubernetes import config
-from mlflow_kubernetes.deployments.kubernetes import KubernetesDeployment
-from mlflow_kubernetes.entrypoints.messagebus import RedisMessageBus
-from mlflow_kubernetes.entrypoints.models_handlers import ModelCreateHandler
+
+# server dependencies (mlflow, docker, git, redis) are imported inside commands,
+# so ``--help`` and client commands start without them
 
 @click.group('models', help="listen for mlflow model event")
 def commands():
@@ -22,13 +24,37 @@ def commands():
 @click.option('--docker-registry-target', '-d', 'docker_registry_target', default=None,
               help='remote docker registry kubernetes used to push/fetch image ')
 @click.option('--kubernetes-config-path', default=None)
-def server(event_target, docker_registry_target, kubernetes_config_path):
+@click.option('--prepull/--no-prepull', 'prepull', default=None,
+              help='pull new model images on all nodes before creating deployment')
+@click.option('--image-builder', type=click.Choice(['docker', 'oci']), default=None,
+              help='build model images by local docker daemon, or daemonless as OCI image')
+@click.option('--micro-batch-size', default=None, type=int,
+              help='batch concurrent requests up to this many rows by a sidecar in model pods')
+@click.option('--micro-batch-latency-ms', default=None, type=float,
+              help='milliseconds a request waits for a micro batch at most')
+@click.option('--asyncio', 'use_asyncio', is_flag=True, default=False,
+              help='handle events concurrently in asyncio event loop')
+@click.option('--max-in-flight', default=None, type=int,
+              help='events handled concurrently with --asyncio')
+def server(event_target, docker_registry_target, kubernetes_config_path, prepull, image_builder,
+           micro_batch_size, micro_batch_latency_ms, use_asyncio, max_in_flight):
     """
     run server to listen for incoming models, create or update models changes corresponding
     """
+    from mlflow_kubernetes.deployments.kubernetes import KubernetesDeployment, MicroBatchingOptions
+    from mlflow_kubernetes.entrypoints.async_messagebus import AsyncRedisMessageBus
+    from mlflow_kubernetes.entrypoints.messagebus import RedisMessageBus
+    from mlflow_kubernetes.entrypoints.models_handlers import ModelCreateHandler
+
     kubernetes_config_path = kubernetes_config_path or config.KUBERNETES_CONFIG_PATH
     docker_registry_target = docker_registry_target or config.DOCKER_REGISTRY_TARGET
-    kube = KubernetesDeployment(docker_registry_target, kubernetes_config_path)
+    micro_batching = None
+    if micro_batch_size:
+        micro_batching = MicroBatchingOptions(
+            micro_batch_size, micro_batch_latency_ms or config.KUBE_MICROBATCH_MAX_LATENCY_MS
+        )
+    kube = KubernetesDeployment(docker_registry_target, kubernetes_config_path, prepull=prepull,
+                                image_builder=image_builder, micro_batching=micro_batching)
 
     handler = ModelCreateHandler(kube)
 
@@ -40,8 +66,12 @@ def server(event_target, docker_registry_target, kubernetes_config_path):
     host, *port = event_target_scheme.netloc.split(':')
     port = int(port[0]) if port else None
 
-    message_bus = RedisMessageBus(host, port, handler)
-    message_bus.run()
+    if use_asyncio:
+        message_bus = AsyncRedisMessageBus(host, port or 6379, handler, max_in_flight=max_in_flight)
+        asyncio.run(message_bus.run())
+    else:
+        message_bus = RedisMessageBus(host, port, handler)
+        message_bus.run()
 
 
 @commands.command("predict")
@@ -53,4 +83,59 @@ def predict(model):
     invoke service named by *model*, and return data
     :param model:
     :return:
-    """
\ No newline at end of file
+    """
+
+@commands.command("bench")
+@click.option("--model", "model", default=None, help="model name deployed in kubernetes")
+@click.option("--version", "version", default=None, help="model version deployed in kubernetes")
+@click.option("--url", "urls", multiple=True,
+              help="scoring server url used instead of kubernetes service, like http://localhost:5000")
+@click.option("--mlmodel", default=None, help="MLmodel file or model directory to generate input from signature")
+@click.option('--input-path', '-i', default=None, help="sample input, csv or json file")
+@click.option('--batch-size', '-b', default=1, type=int, help="rows per request")
+@click.option('--concurrency', '-c', default='1,2,4,8', help="stepped concurrency levels, comma separated")
+@click.option('--rate', '-r', default=None, type=float, help="fixed requests per second instead of concurrency steps")
+@click.option('--duration', default=10.0, type=float, help="seconds of each step")
+@click.option('--kubernetes-config-path', default=None)
+@click.option('--report', '-o', 'report_path', default=None, help="save json report to file")
+def bench(model, version, urls, mlmodel, input_path, batch_size, concurrency, rate, duration,
+          kubernetes_config_path, report_path):
+    """
+    load test a deployed model service, report throughput, latency percentiles, error rate
+    and distribution over endpoints. endpoints are pods when running inside the cluster, node
+    ports outside of it, which kube-proxy balances over all pods, so not per replica
+    """
+    from mlflow_kubernetes import loadtest
+
+    if input_path:
+        sample = loadtest.load_sample_input(input_path)
+    elif mlmodel:
+        sample = loadtest.synthetic_input_from_mlmodel(mlmodel, rows=max(100, batch_size))
+    else:
+        raise click.UsageError('either --input-path or --mlmodel is required')
+
+    if urls:
+        endpoints = [url.rstrip('/') for url in urls]
+    elif model and version:
+        from mlflow_kubernetes.client import ModelService
+
+        service = ModelService(model, version, kubernetes_config_path or config.KUBERNETES_CONFIG_PATH)
+        endpoints = ['http://{}:{}'.format(host, port) for host, port in service.get_service_endpoints(fallback=False)]
+        if not service.in_cluster:
+            click.echo('load testing through node ports, per endpoint results are not per replica')
+    else:
+        raise click.UsageError('either --url or --model with --version is required')
+
+    tester = loadtest.LoadTester(endpoints, sample, batch_size=batch_size)
+    if rate:
+        steps = [tester.run_rate(rate, duration)]
+        click.echo(loadtest.format_step(steps[0]))
+    else:
+        steps = []
+        for level in concurrency.split(','):
+            steps.append(tester.run_concurrency(int(level), duration))
+            click.echo(loadtest.format_step(steps[-1]))
+
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(dict(model=model, version=version, endpoints=endpoints, steps=steps), f, indent=2)
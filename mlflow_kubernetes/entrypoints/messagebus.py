@@ -2,12 +2,11 @@ import abc
 import json
 import logging
 import os
+import queue
 import time
 from collections import defaultdict
 from typing import Tuple, Any
 
-import redis
-
 
 class MessageBus:
     """
@@ -80,8 +79,8 @@ class MessageBus:
             messages = handler.handle(topic, event)
 
             if messages:
-                for topic, message in messages:
-                    self.dispatch_event(topic, message)
+                for out_topic, message in messages:
+                    self.dispatch_event(out_topic, message)
 
     @abc.abstractmethod
     def get_message(self) -> Tuple[str, Any]:
@@ -107,6 +106,8 @@ class MessageBus:
 class RedisMessageBus(MessageBus):
 
     def __init__(self, host='localhost', port=6379, *handlers):
+        import redis
+
         # register handle use these information
         self._redis = redis.StrictRedis(
             host=host, port=port, encoding='utf-8',
@@ -128,3 +129,36 @@ class RedisMessageBus(MessageBus):
             topic = response['channel']
             if topic:
                 return topic, json.loads(response['data'])
+
+
+class InMemoryMessageBus(MessageBus):
+    """
+    in-process message bus with the same semantics as :py:class:`RedisMessageBus`, events
+    are json encoded when published and only delivered when topic subscribed. useful for
+    tests and benchmarks without a redis server.
+    """
+    _STOP = object()
+
+    def __init__(self, *handlers):
+        self._queue = queue.Queue()
+        self._subscribed = set()
+        super(InMemoryMessageBus, self).__init__(*handlers)
+
+    def _subsribe(self, topic):
+        self._subscribed.add(topic)
+
+    def _publish(self, topic, event):
+        if topic in self._subscribed:
+            self._queue.put((topic, json.dumps(event)))
+
+    def get_message(self):
+        item = self._queue.get()
+        if item is self._STOP:
+            super(InMemoryMessageBus, self).stop()
+            return None, None
+        topic, data = item
+        return topic, json.loads(data)
+
+    def stop(self):
+        # queued behind published events, so they are still handled before stopped
+        self._queue.put(self._STOP)
@@ -1,4 +1,8 @@
-from mlflow_kubernetes.deployments.kubernetes import KubernetesDeployment
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mlflow_kubernetes.deployments.kubernetes import KubernetesDeployment
+
 
 class ModelCreateHandler:
     """
@@ -6,7 +10,7 @@ class ModelCreateHandler:
     """
     topics = ['model_created']
 
-    def __init__(self, kube_deployment: KubernetesDeployment):
+    def __init__(self, kube_deployment: 'KubernetesDeployment'):
         self.kube_deployment = kube_deployment
 
     def handle_model_created(self, event):
@@ -0,0 +1,243 @@
+"""
+load test model services to find out sustainable throughput and latency before sizing them.
+
+requests are sent round robin over the given endpoints, either with stepped concurrency (closed
+loop) or at a fixed request rate (open loop). input is generated from model signature in
+``MLmodel`` or sampled from a csv/json file.
+
+results are also broken down per endpoint, which is per replica only when endpoints are pods
+or scoring servers themselves. a node port endpoint is balanced by kube-proxy over all pods.
+"""
+import csv
+import itertools
+import json
+import os
+import random
+import string
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+MLMODEL_FILE_NAME = 'MLmodel'
+
+
+def _random_value(column_type):
+    if column_type in ('double', 'float'):
+        return random.uniform(0, 10)
+    if column_type in ('long', 'integer'):
+        return random.randint(0, 100)
+    if column_type == 'boolean':
+        return random.random() < 0.5
+    if column_type == 'string':
+        return ''.join(random.choices(string.ascii_letters, k=8))
+    raise ValueError('column type {} not support for synthetic input'.format(column_type))
+
+
+def synthetic_input_from_mlmodel(path, rows=100):
+    """
+    generate random rows from model input signature
+
+    :param path: ``MLmodel`` file or model directory contains it
+    :param rows: rows generated
+    :return: pandas *split* orient dict, with ``columns`` and ``data``
+    """
+    import yaml
+
+    if os.path.isdir(path):
+        path = os.path.join(path, MLMODEL_FILE_NAME)
+    with open(path) as f:
+        model_meta = yaml.safe_load(f)
+
+    signature = model_meta.get('signature') or {}
+    if not signature.get('inputs'):
+        raise ValueError('model {} has no input signature, provide sample input instead'.format(path))
+
+    inputs = json.loads(signature['inputs'])
+    if any(spec.get('type') == 'tensor' for spec in inputs):
+        raise ValueError('only column based signature support synthetic input')
+
+    columns = [spec.get('name', str(idx)) for idx, spec in enumerate(inputs)]
+    data = [[_random_value(spec['type']) for spec in inputs] for _ in range(rows)]
+    return dict(columns=columns, data=data)
+
+
+def _parse_value(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            continue
+    return value
+
+
+def load_sample_input(path):
+    """
+    read sample input from csv with header or json, json can be pandas *split* or *records* orient
+
+    :return: pandas *split* orient dict, with ``columns`` and ``data``
+    """
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            reader = csv.reader(f)
+            columns = next(reader)
+            return dict(columns=columns, data=[[_parse_value(v) for v in row] for row in reader])
+
+    with open(path) as f:
+        sample = json.load(f)
+    if isinstance(sample, list):
+        columns = list(sample[0].keys())
+        return dict(columns=columns, data=[[record[c] for c in columns] for record in sample])
+    return dict(columns=sample['columns'], data=sample['data'])
+
+
+def batches(sample, batch_size):
+    """
+    endless iterator of request bodies with *batch_size* rows, cycling over sample rows
+    """
+    rows = itertools.cycle(sample['data'])
+    while True:
+        yield dict(columns=sample['columns'], data=list(itertools.islice(rows, batch_size)))
+
+
+def percentile(samples, p):
+    """*samples* should be sorted"""
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+
+def _latency_summary(latencies):
+    latencies = sorted(latencies)
+    summary = {'p{}'.format(p): percentile(latencies, p) for p in (50, 95, 99)}
+    summary['mean'] = sum(latencies) / len(latencies) if latencies else None
+    summary['max'] = latencies[-1] if latencies else None
+    return summary
+
+
+class LoadTester:
+    """
+    send prediction requests to *endpoints* and collect latency of every request.
+
+    :param endpoints: base urls of scoring servers, like ``http://10.0.0.1:31080``
+    :param sample: pandas *split* orient dict which request bodies are sampled from
+    :param batch_size: rows in each request
+    :param timeout: seconds before a request is counted as error
+    """
+
+    def __init__(self, endpoints, sample, batch_size=1, timeout=30):
+        if not endpoints:
+            raise ValueError('no endpoints to load test')
+        self.endpoints = list(endpoints)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._bodies = batches(sample, batch_size)
+        self._endpoint_cycle = itertools.cycle(self.endpoints)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _next_request(self):
+        with self._lock:
+            return next(self._endpoint_cycle), next(self._bodies)
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            import requests
+
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _send(self, records, started=None):
+        """
+        :param started: time request was scheduled at, latency of a request delayed by a
+                        busy client still counts from it
+        """
+        import requests
+
+        endpoint, body = self._next_request()
+        started = started or time.perf_counter()
+        try:
+            resp = self._session().post('{}/invocations'.format(endpoint), json=body, timeout=self.timeout)
+            ok = resp.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        records.append((endpoint, time.perf_counter() - started, ok))
+
+    def run_concurrency(self, concurrency, duration):
+        """
+        closed loop, *concurrency* clients send next request as soon as last one finished
+        """
+        records = []
+        deadline = time.perf_counter() + duration
+
+        def client():
+            while time.perf_counter() < deadline:
+                self._send(records)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self.report(records, time.perf_counter() - start, concurrency=concurrency)
+
+    def run_rate(self, rate, duration, max_concurrency=64):
+        """
+        open loop, send *rate* requests per second whether or not earlier ones finished
+        """
+        records = []
+        interval = 1.0 / rate
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            for i in range(int(rate * duration)):
+                scheduled = start + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, records, scheduled)
+        return self.report(records, time.perf_counter() - start, rate=rate)
+
+    def report(self, records, elapsed, **params):
+        latencies = [latency for _, latency, ok in records if ok]
+        errors = sum(1 for _, _, ok in records if not ok)
+
+        per_endpoint = defaultdict(list)
+        for endpoint, latency, ok in records:
+            per_endpoint[endpoint].append((latency, ok))
+
+        result = dict(params)
+        result.update(
+            batch_size=self.batch_size,
+            seconds=elapsed,
+            requests=len(records),
+            errors=errors,
+            error_rate=errors / len(records) if records else 0.0,
+            throughput=len(latencies) / elapsed if elapsed else 0.0,
+            rows_per_sec=len(latencies) * self.batch_size / elapsed if elapsed else 0.0,
+            latency=_latency_summary(latencies),
+            per_endpoint={
+                endpoint: dict(
+                    requests=len(samples),
+                    errors=sum(1 for _, ok in samples if not ok),
+                    share=len(samples) / len(records),
+                    latency=_latency_summary([latency for latency, ok in samples if ok]),
+                )
+                for endpoint, samples in sorted(per_endpoint.items())
+            },
+        )
+        return result
+
+
+def format_step(step):
+    """one line summary of a load test step"""
+    latency = step['latency']
+    load = 'concurrency={}'.format(step['concurrency']) if 'concurrency' in step else 'rate={}'.format(step['rate'])
+
+    def ms(value):
+        return '-' if value is None else '{:.1f}ms'.format(value * 1000)
+
+    return '{} throughput={:.1f}/s p50={} p95={} p99={} errors={:.2%}'.format(
+        load, step['throughput'], ms(latency['p50']), ms(latency['p95']), ms(latency['p99']),
+        step['error_rate']
+    )
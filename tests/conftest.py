@@ -1,6 +1,9 @@
+import json
 import logging
 import signal
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from subprocess import PIPE
 import sys
 from tempfile import TemporaryFile
@@ -10,6 +13,48 @@ import subprocess
 import shlex
 from pathlib import Path
 
+class ScoringHandler(BaseHTTPRequestHandler):
+    """stand-in of mlflow scoring server, predicts sum of each row, rows starting negative are bad request"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.batches.append(len(body['data']))
+        if any(row[0] < 0 for row in body['data']):
+            self.send_response(400)
+            payload = json.dumps({'error_code': 'BAD_REQUEST'}).encode()
+        else:
+            self.send_response(200)
+            payload = json.dumps([sum(row) for row in body['data']]).encode()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture()
+def scoring_server():
+    """
+    function starting a scoring server stand-in, its ``batches`` records rows of each request.
+    servers started are shut down after test
+    """
+    servers = []
+
+    def start():
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ScoringHandler)
+        server.batches = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
 @pytest.fixture(scope='session')
 def mlflow_server():
     with tempfile.TemporaryDirectory() as tmpdir:
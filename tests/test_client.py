@@ -16,4 +16,80 @@ def test_model_predict_df(magic_mock):
 
     result = model_service.predict(df)
 
-    assert model_service._request.assert_called_once()
\ No newline at end of file
+    assert model_service._request.assert_called_once()
+
+def endpoint_address(ip, node_name):
+    return MagicMock(ip=ip, node_name=node_name)
+
+
+def test_in_cluster_endpoints_prefer_local_node_then_zone(monkeypatch):
+    from mlflow_kubernetes import config
+
+    monkeypatch.setattr(config, 'KUBE_NODE_NAME', 'node-a')
+    model_service = ModelService.__new__(ModelService)
+    model_service.model_name = 'fake-1'
+    model_service.in_cluster = True
+    model_service._node_zones = {}
+    model_service._kube = MagicMock()
+
+    subset = MagicMock(ports=[MagicMock(port=8080)], addresses=[
+        endpoint_address('10.0.2.1', 'node-c'),
+        endpoint_address('10.0.1.1', 'node-b'),
+        endpoint_address('10.0.0.1', 'node-a'),
+    ])
+    model_service._kube.read_namespaced_endpoints.return_value = MagicMock(subsets=[subset])
+    zones = {'node-a': 'zone-1', 'node-b': 'zone-1', 'node-c': 'zone-2'}
+    model_service._kube.read_node.side_effect = lambda name: MagicMock(
+        metadata=MagicMock(labels={config.KUBE_TOPOLOGY_ZONE_LABEL: zones[name]})
+    )
+    service = model_service._kube.read_namespaced_service.return_value
+    service.spec.cluster_ip = '10.96.0.10'
+    service.spec.ports = [MagicMock(port=8080)]
+
+    assert model_service.get_service_endpoints() == [
+        ('10.0.0.1', 8080), ('10.0.1.1', 8080), ('10.0.2.1', 8080), ('10.96.0.10', 8080)
+    ]
+    assert model_service.get_service_endpoints(fallback=False)[-1] == ('10.0.2.1', 8080)
+
+
+@pytest.mark.parametrize('kube_config_path, in_cluster, expected', [
+    (None, None, True),
+    ('/tmp/kubeconfig', None, False),
+    ('/tmp/kubeconfig', True, True),
+])
+def test_explicit_kube_config_path_means_out_of_cluster(monkeypatch, tmp_path, kube_config_path, in_cluster, expected):
+    from kubernetes import config as kube_config
+    from mlflow_kubernetes import client, config
+
+    # looks like running in a pod
+    (tmp_path / 'token').write_text('token')
+    monkeypatch.setattr(client, 'SERVICE_ACCOUNT_PATH', str(tmp_path))
+    monkeypatch.setenv('KUBERNETES_SERVICE_HOST', '10.96.0.1')
+    monkeypatch.setattr(config, 'KUBE_IN_CLUSTER', None)
+    monkeypatch.setattr(kube_config, 'load_incluster_config', MagicMock())
+    monkeypatch.setattr(kube_config, 'load_kube_config', MagicMock())
+
+    model_service = ModelService('fake', '1', kube_config_path=kube_config_path, in_cluster=in_cluster)
+
+    assert model_service.in_cluster is expected
+    if expected:
+        kube_config.load_incluster_config.assert_called_once()
+    else:
+        kube_config.load_kube_config.assert_called_once_with(config_file=kube_config_path)
+
+
+def test_in_cluster_endpoints_forbidden_fallback_node_ports():
+    from kubernetes.client.rest import ApiException
+
+    model_service = ModelService.__new__(ModelService)
+    model_service.model_name = 'fake-1'
+    model_service.in_cluster = True
+    model_service._node_zones = {}
+    model_service._kube = MagicMock()
+    model_service._kube.read_namespaced_endpoints.side_effect = ApiException(status=403, reason='Forbidden')
+    model_service._kube.list_namespaced_pod.return_value = MagicMock(items=[
+        MagicMock(status=MagicMock(host_ip='192.168.0.1', phase='Running'))
+    ])
+    model_service._kube.read_namespaced_service.return_value.spec.ports = [MagicMock(node_port=31080)]
+
+    assert model_service.get_service_endpoints() == [('192.168.0.1', 31080)]
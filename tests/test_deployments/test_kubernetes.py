@@ -0,0 +1,73 @@
+from unittest import mock
+
+import pytest
+from kubernetes.client.rest import ApiException
+
+from mlflow_kubernetes.deployments import kubernetes
+
+
+def status(ready, desired, observed=1):
+    daemonset = mock.Mock()
+    daemonset.metadata.generation = 1
+    daemonset.status.number_ready = ready
+    daemonset.status.desired_number_scheduled = desired
+    daemonset.status.observed_generation = observed
+    return daemonset
+
+
+def fake_deployment():
+    deployment = kubernetes.KubernetesDeployment.__new__(kubernetes.KubernetesDeployment)
+    deployment._apps_api = mock.Mock()
+    deployment._core_api = mock.Mock()
+    return deployment
+
+
+def test_prepull_image_waits_all_nodes(monkeypatch):
+    monkeypatch.setattr(kubernetes, 'PREPULL_POLL_INTERVAL', 0)
+    deployment = fake_deployment()
+    deployment._apps_api.read_namespaced_daemon_set_status.side_effect = [
+        status(0, 0, observed=0), status(1, 3), status(3, 3)
+    ]
+
+    elapsed = deployment.prepull_image('fake-1', 'localhost/fake/fake:1')
+
+    assert elapsed is not None
+    assert deployment._apps_api.read_namespaced_daemon_set_status.call_count == 3
+    body = deployment._apps_api.create_namespaced_daemon_set.call_args[1]['body']
+    assert body.metadata.name == 'fake-1-prepull'
+    assert body.spec.template.spec.init_containers[0].image == 'localhost/fake/fake:1'
+    deployment._apps_api.delete_namespaced_daemon_set.assert_called_once()
+
+
+def test_prepull_image_timeout_still_cleanup(monkeypatch):
+    monkeypatch.setattr(kubernetes, 'PREPULL_POLL_INTERVAL', 0)
+    deployment = fake_deployment()
+    deployment._apps_api.read_namespaced_daemon_set_status.return_value = status(1, 3)
+
+    assert deployment.prepull_image('fake-1', 'localhost/fake/fake:1', timeout=0.01) is None
+    deployment._apps_api.delete_namespaced_daemon_set.assert_called_once()
+
+
+@pytest.mark.parametrize('failed_call', ['create_namespaced_daemon_set', 'read_namespaced_daemon_set_status'])
+def test_prepull_image_api_error_not_abort_deployment(failed_call):
+    deployment = fake_deployment()
+    getattr(deployment._apps_api, failed_call).side_effect = ApiException(status=403, reason='Forbidden')
+    deployment._apps_api.delete_namespaced_daemon_set.side_effect = ApiException(status=403, reason='Forbidden')
+
+    assert deployment.prepull_image('fake-1', 'localhost/fake/fake:1') is None
+    deployment._apps_api.delete_namespaced_daemon_set.assert_called_once()
+
+
+def test_deployment_object_with_micro_batching_sidecar():
+    deployment = fake_deployment()
+
+    obj = deployment.create_deployment_object(
+        'fake-1', 'localhost/fake/fake:1', micro_batching=kubernetes.MicroBatchingOptions(32, 5)
+    )
+
+    model, sidecar = obj.spec.template.spec.containers
+    # service targets port named after deployment, which is sidecar now
+    assert model.ports[0].name == 'model'
+    assert sidecar.ports[0].name == 'fake-1'
+    assert '--max-batch-size' in sidecar.command
+    assert obj.spec.template.spec.volumes[0].config_map.name == 'fake-1-microbatch'
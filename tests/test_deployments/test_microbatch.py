@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from mlflow_kubernetes.deployments.microbatch import MicroBatcher, MicroBatchServer
+
+
+@pytest.fixture()
+def proxy(scoring_server):
+    upstream = scoring_server()
+    proxy = MicroBatchServer(('127.0.0.1', 0), 'http://127.0.0.1:{}'.format(upstream.server_port),
+                             max_batch_size=32, max_latency=0.05, workers=1)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}/invocations'.format(proxy.server_port), upstream
+    proxy.shutdown()
+    proxy.server_close()
+
+
+def test_concurrent_rows_predicted_in_batches(proxy):
+    url, upstream = proxy
+
+    def predict(i):
+        return requests.post(url, json={'columns': ['a', 'b'], 'data': [[i, 1]]}).json()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(predict, range(32)))
+
+    assert results == [[i + 1] for i in range(32)]
+    assert sum(upstream.batches) == 32
+    assert len(upstream.batches) < 32
+
+
+def test_bad_request_not_fail_others(proxy):
+    url, upstream = proxy
+
+    def predict(i):
+        return requests.post(url, json={'columns': ['a'], 'data': [[i]]})
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(predict, [-1, 1, 2, 3]))
+
+    assert responses[0].status_code == 400
+    assert [resp.json() for resp in responses[1:]] == [[1], [2], [3]]
+
+
+def test_malformed_request_forwarded_not_kill_worker(proxy):
+    url, upstream = proxy
+
+    # not concatenable, scoring server gets them as they are
+    bad = requests.post(url, json={'columns': 'a', 'data': 5}, timeout=5)
+    nested = requests.post(url, json={'columns': [['a']], 'data': [[1]]}, timeout=5)
+    good = requests.post(url, json={'columns': ['a', 'b'], 'data': [[1, 2]]}, timeout=5)
+
+    assert bad.status_code != 200
+    assert nested.json() == [1]
+    assert good.json() == [3]
+    assert upstream.batches == [1, 1]
+
+
+def test_batch_failure_not_kill_worker():
+    def predict(columns, rows):
+        return [0] * len(rows)
+
+    batcher = MicroBatcher(predict, max_latency=0, workers=1)
+
+    # bypass payload validation of http handler
+    with pytest.raises(TypeError):
+        batcher.submit('a', 5)
+    assert batcher.submit(['a'], [[1]]) == [0]
+
+
+def test_batch_size_never_exceeds_max():
+    batches = []
+
+    def predict(columns, rows):
+        batches.append(len(rows))
+        return [0] * len(rows)
+
+    batcher = MicroBatcher(predict, max_batch_size=64, max_latency=0.2, workers=1)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(lambda size: batcher.submit(['a'], [[1]] * size), [1, 60, 60]))
+
+    assert [len(result) for result in results] == [1, 60, 60]
+    assert sorted(batches) == [60, 61]
+    # a single request larger than max is not split
+    assert batcher.submit(['a'], [[1]] * 100) == [0] * 100
+    assert batches[-1] == 100
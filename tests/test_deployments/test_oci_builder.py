@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+
+from mlflow_kubernetes.deployments import model_registry, oci_builder
+
+
+def digest(data):
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+class FakeRegistry(ThreadingHTTPServer):
+    """stand-in of docker registry http api v2, keeps blobs per repository in memory"""
+
+    def __init__(self):
+        super(FakeRegistry, self).__init__(('127.0.0.1', 0), FakeRegistryHandler)
+        self.blobs = {}
+        self.manifests = {}
+        self.uploads = {}
+        self.requests = []
+        # (repository, digest) of blobs mounted across repositories
+        self.mounts = []
+        self.lock = threading.Lock()
+
+
+class FakeRegistryHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def route(self):
+        url = urllib.parse.urlparse(self.path)
+        repository, kind, reference = url.path[len('/v2/'):].rsplit('/', 2)
+        if kind == 'uploads':
+            repository = repository.rsplit('/', 1)[0]
+        self.server.requests.append((self.command, kind, repository))
+        return repository, kind, reference, urllib.parse.parse_qs(url.query)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        repository, kind, reference, _ = self.route()
+        if kind == 'manifests' and (repository, reference) in self.server.manifests:
+            media_type, body = self.server.manifests[repository, reference]
+            return self.reply(200, body, {'Content-Type': media_type, 'Docker-Content-Digest': digest(body)})
+        if kind == 'blobs' and (repository, reference) in self.server.blobs:
+            return self.reply(200, self.server.blobs[repository, reference])
+        self.reply(404)
+
+    def do_POST(self):
+        repository, _, _, query = self.route()
+        if 'mount' in query:
+            source = (query['from'][0], query['mount'][0])
+            if source in self.server.blobs:
+                self.server.blobs[repository, source[1]] = self.server.blobs[source]
+                self.server.mounts.append((repository, source[1]))
+                return self.reply(201)
+        with self.server.lock:
+            upload_id = str(len(self.server.uploads))
+            self.server.uploads[upload_id] = repository
+        self.reply(202, headers={'Location': '/v2/{}/blobs/uploads/{}'.format(repository, upload_id)})
+
+    def do_PUT(self):
+        repository, kind, reference, query = self.route()
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if kind == 'manifests':
+            self.server.manifests[repository, reference] = (self.headers['Content-Type'], body)
+            return self.reply(201, headers={'Docker-Content-Digest': digest(body)})
+        assert digest(body) == query['digest'][0]
+        self.server.blobs[self.server.uploads.pop(reference), query['digest'][0]] = body
+        self.reply(201)
+
+
+@pytest.fixture()
+def registry():
+    server = FakeRegistry()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # generic serving base image with one layer
+    layer = gzip.compress(b'base layer')
+    image_config = json.dumps({'config': {'Entrypoint': ['serve']},
+                               'rootfs': {'type': 'layers', 'diff_ids': [digest(b'base layer')]}}).encode()
+    manifest = json.dumps({
+        'schemaVersion': 2, 'mediaType': oci_builder.DOCKER_MANIFEST,
+        'config': {'mediaType': oci_builder.DOCKER_CONFIG, 'digest': digest(image_config), 'size': len(image_config)},
+        'layers': [{'mediaType': oci_builder.DOCKER_LAYER, 'digest': digest(layer), 'size': len(layer)}],
+    }).encode()
+    server.blobs['fake/mlflow-serving', digest(layer)] = layer
+    server.blobs['fake/mlflow-serving', digest(image_config)] = image_config
+    server.manifests['fake/mlflow-serving', 'latest'] = (oci_builder.DOCKER_MANIFEST, manifest)
+
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def model_dir(tmp_path):
+    model = tmp_path / 'model'
+    (model / 'data').mkdir(parents=True)
+    (model / 'MLmodel').write_text('flavors: {}\n')
+    (model / 'data' / 'model.pkl').write_bytes(b'pickled')
+    return str(model)
+
+
+def test_build_layer_reproducible(model_dir, tmp_path):
+    first = oci_builder.build_layer(model_dir, str(tmp_path / 'first.tar.gz'))
+    second = oci_builder.build_layer(model_dir, str(tmp_path / 'second.tar.gz'))
+
+    assert first == second
+    with tarfile.open(str(tmp_path / 'first.tar.gz')) as tar:
+        assert 'opt/ml/model/data/model.pkl' in tar.getnames()
+        assert tar.extractfile('opt/ml/model/MLmodel').read() == b'flavors: {}\n'
+
+
+def base_layer_digest(registry):
+    return json.loads(registry.manifests['fake/mlflow-serving', 'latest'][1])['layers'][0]['digest']
+
+
+def uploaded(registry):
+    return sum(1 for method, kind, _ in registry.requests if method == 'PUT' and kind == 'uploads')
+
+
+def test_build_and_push_mounts_base_layers(registry, model_dir):
+    registry_info = model_registry.RegistryInfo(None, None, '127.0.0.1:{}'.format(registry.server_port), 'fake')
+    builder = oci_builder.OCIModelImageBuilder('iris', None, '1')
+    builder.registry_info = registry_info
+
+    manifest_digest = builder.build_image_from_directory(model_dir)
+
+    media_type, manifest_bytes = registry.manifests['fake/iris', '1']
+    assert digest(manifest_bytes) == manifest_digest
+    manifest = json.loads(manifest_bytes)
+    assert media_type == oci_builder.DOCKER_MANIFEST
+    assert len(manifest['layers']) == 2
+    for blob in [manifest['config']] + manifest['layers']:
+        assert ('fake/iris', blob['digest']) in registry.blobs
+
+    image_config = json.loads(registry.blobs['fake/iris', manifest['config']['digest']])
+    assert image_config['config'] == {'Entrypoint': ['serve']}
+    assert len(image_config['rootfs']['diff_ids']) == 2
+
+    # base layer mounted, only base config downloaded, model layer and config uploaded
+    assert registry.mounts == [('fake/iris', base_layer_digest(registry))]
+    assert registry.requests.count(('GET', 'blobs', 'fake/mlflow-serving')) == 1
+    assert uploaded(registry) == 2
+
+    # unchanged model pushed again only checks blobs existence
+    registry.requests.clear()
+    builder.build_image_from_directory(model_dir)
+    assert not any(method in ('POST', 'PATCH') for method, _, _ in registry.requests)
+
+
+def test_oci_archive_includes_base_layers(registry, model_dir, tmp_path):
+    builder = oci_builder.OCIModelImageBuilder('iris', None, '1')
+    builder.registry_info = model_registry.RegistryInfo(None, None, '127.0.0.1:{}'.format(registry.server_port), 'fake')
+
+    archive = str(tmp_path / 'iris.tar')
+    builder.build_image_from_directory(model_dir, oci_archive=archive)
+
+    manifest = json.loads(registry.manifests['fake/iris', '1'][1])
+    with tarfile.open(archive) as tar:
+        assert {'./oci-layout', './index.json'} <= set(tar.getnames())
+        for blob in [manifest['config']] + manifest['layers']:
+            algorithm, hexdigest = blob['digest'].split(':')
+            assert tar.extractfile('./blobs/{}/{}'.format(algorithm, hexdigest)).read() == \
+                registry.blobs['fake/iris', blob['digest']]
+
+    # base layer fetched for archive is still mounted, not uploaded
+    assert registry.mounts == [('fake/iris', base_layer_digest(registry))]
+    assert uploaded(registry) == 2
+
+
+def test_create_image_from_models_uri(registry, model_dir):
+    builder = oci_builder.OCIModelImageBuilder('iris', None, '1')
+    builder.registry_info = model_registry.RegistryInfo(None, None, '127.0.0.1:{}'.format(registry.server_port), 'fake')
+    downloaded = []
+
+    def download(uri, output_path):
+        # mlflow downloads into an existing directory
+        assert os.path.isdir(output_path)
+        downloaded.append(uri)
+        return shutil.copytree(model_dir, os.path.join(output_path, 'iris'))
+
+    repository = mock.Mock()
+    repository.is_models_uri.return_value = True
+    repository.get_underlying_uri.return_value = 's3://bucket/1/artifacts/model'
+    with mock.patch('mlflow.store.artifact.models_artifact_repo.ModelsArtifactRepository', repository), \
+            mock.patch('mlflow.tracking.artifact_utils._download_artifact_from_uri', download):
+        manifest_digest = builder.create_image_from_uri('models:/iris/1')
+
+    assert downloaded == ['s3://bucket/1/artifacts/model']
+    repository.get_underlying_uri.assert_called_once_with('models:/iris/1')
+    assert digest(registry.manifests['fake/iris', '1'][1]) == manifest_digest
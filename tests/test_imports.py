@@ -0,0 +1,34 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+def loaded_modules(code, modules):
+    script = '\n'.join([
+        code,
+        'import sys, json',
+        'print(json.dumps(sorted(m for m in {!r} if m in sys.modules)))'.format(modules),
+    ])
+    proc = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize('code', [
+    'import mlflow_kubernetes',
+    'from mlflow_kubernetes import client',
+])
+def test_client_import_is_lightweight(code):
+    assert loaded_modules(code, ['pandas', 'kubernetes', 'requests']) == []
+
+
+def test_cli_help_not_import_server_dependencies():
+    code = '\n'.join([
+        'from mlflow_kubernetes.cli import cli',
+        'try:',
+        "    cli(['models', 'server', '--help'])",
+        'except SystemExit:',
+        '    pass',
+    ])
+    assert loaded_modules(code, ['mlflow', 'docker', 'git', 'redis', 'kubernetes', 'pandas']) == []
@@ -0,0 +1,56 @@
+import pytest
+
+from mlflow_kubernetes import loadtest
+
+MLMODEL = """
+flavors:
+  python_function:
+    loader_module: mlflow.sklearn
+signature:
+  inputs: '[{"name": "sepal length (cm)", "type": "double"}, {"name": "label", "type": "long"}]'
+  outputs: '[{"type": "long"}]'
+"""
+
+
+@pytest.fixture()
+def scoring_servers(scoring_server):
+    return ['http://127.0.0.1:{}'.format(scoring_server().server_port) for _ in range(2)]
+
+
+def test_synthetic_input_from_mlmodel(tmp_path):
+    (tmp_path / 'MLmodel').write_text(MLMODEL)
+
+    sample = loadtest.synthetic_input_from_mlmodel(str(tmp_path), rows=3)
+
+    assert sample['columns'] == ['sepal length (cm)', 'label']
+    assert len(sample['data']) == 3
+    assert isinstance(sample['data'][0][0], float) and isinstance(sample['data'][0][1], int)
+
+
+def test_load_sample_input_csv(tmp_path):
+    path = tmp_path / 'sample.csv'
+    path.write_text('a,b\n1,2.5\n3,4.5\n')
+
+    assert loadtest.load_sample_input(str(path)) == dict(columns=['a', 'b'], data=[[1, 2.5], [3, 4.5]])
+
+
+def test_run_concurrency_round_robin_endpoints(scoring_servers):
+    sample = dict(columns=['a'], data=[[1], [2], [3]])
+    tester = loadtest.LoadTester(scoring_servers, sample, batch_size=2)
+
+    step = tester.run_concurrency(2, duration=0.3)
+
+    assert step['requests'] > 0 and step['errors'] == 0
+    assert set(step['per_endpoint']) == set(scoring_servers)
+    assert step['latency']['p50'] <= step['latency']['p99']
+    assert step['rows_per_sec'] == pytest.approx(step['throughput'] * 2)
+
+
+def test_run_rate_counts_unreachable_as_errors(scoring_servers):
+    tester = loadtest.LoadTester(scoring_servers + ['http://127.0.0.1:1'], dict(columns=['a'], data=[[1]]))
+
+    step = tester.run_rate(30, duration=0.3)
+
+    assert step['requests'] == 9
+    assert step['errors'] == 3
+    assert step['per_endpoint']['http://127.0.0.1:1']['errors'] == 3
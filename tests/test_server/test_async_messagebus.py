@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+from mlflow_kubernetes.entrypoints.async_messagebus import AsyncMessageBus, AsyncInMemoryMessageBus
+
+
+class QueueMessageBus(AsyncMessageBus):
+
+    def __init__(self, *handlers, **kwargs):
+        self._queue = None
+        self.subscribed = set()
+        self.published = []
+        super(QueueMessageBus, self).__init__(*handlers, **kwargs)
+
+    @property
+    def queue(self):
+        # created in running loop, like asyncio.run of python 3.8 and 3.9 requires
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def _subsribe(self, topic):
+        self.subscribed.add(topic)
+
+    async def _publish(self, topic, event):
+        self.published.append((topic, event))
+
+    async def get_message(self):
+        return await self.queue.get()
+
+
+class SlowHandler:
+    topics = ['model_created']
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.threads = set()
+
+    def handle(self, topic, event):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return [('model_deployed', event)]
+
+
+class AsyncHandler:
+    topics = ['model_created']
+
+    def __init__(self):
+        self.events = []
+
+    async def handle(self, topic, event):
+        await asyncio.sleep(0)
+        self.events.append(event)
+
+
+def test_handlers_of_same_topic_run_concurrently():
+    blocking, coroutine = SlowHandler(0.2), AsyncHandler()
+    bus = QueueMessageBus(blocking, SlowHandler(0.2), coroutine)
+
+    start = time.monotonic()
+    asyncio.run(bus.handle_event('model_created', {'model': 1}))
+
+    assert time.monotonic() - start < 0.35
+    assert coroutine.events == [{'model': 1}]
+    assert bus.published == [('model_deployed', {'model': 1})] * 2
+
+
+def test_run_bounded_and_stop_promptly():
+    handler = SlowHandler(0.1)
+    bus = QueueMessageBus(handler, max_in_flight=2)
+
+    async def scenario():
+        for i in range(4):
+            bus.queue.put_nowait(('model_created', {'model': i}))
+        runner = asyncio.ensure_future(bus.run())
+        # bus is blocked in get_message after consumed all events
+        await asyncio.sleep(0.3)
+        bus.stop()
+        await asyncio.wait_for(runner, 1)
+
+    asyncio.run(scenario())
+
+    assert bus.subscribed == {'model_created'}
+    assert len(bus.published) == 4
+    assert len(handler.threads) <= 2
+
+    # stop while all slots are busy, waits only for events in flight
+    handler = SlowHandler(0.5)
+    bus = QueueMessageBus(handler, max_in_flight=1)
+
+    async def busy_scenario():
+        for i in range(3):
+            bus.queue.put_nowait(('model_created', {'model': i}))
+        runner = asyncio.ensure_future(bus.run())
+        await asyncio.sleep(0.1)
+        start = time.monotonic()
+        bus.stop()
+        await asyncio.wait_for(runner, 1)
+        return time.monotonic() - start
+
+    assert asyncio.run(busy_scenario()) < 0.6
+    assert bus.published == [('model_deployed', {'model': 0})]
+    # not fetched events are left in backend
+    assert bus.queue.qsize() == 2
+
+
+def test_in_memory_bus_created_outside_loop():
+    handler = AsyncHandler()
+    bus = AsyncInMemoryMessageBus(handler)
+
+    async def scenario():
+        runner = asyncio.ensure_future(bus.run())
+        # let bus subscribe and wait for messages before publishing
+        await asyncio.sleep(0.05)
+        await bus.dispatch_event('model_created', {'model': 1})
+        await asyncio.sleep(0.05)
+        bus.stop()
+        await asyncio.wait_for(runner, 1)
+
+    asyncio.run(scenario())
+
+    assert handler.events == [{'model': 1}]
@@ -0,0 +1,50 @@
+import asyncio
+
+from mlflow_kubernetes.entrypoints.async_messagebus import AsyncInMemoryMessageBus
+from mlflow_kubernetes.entrypoints.messagebus import InMemoryMessageBus
+
+
+class RecordHandler:
+    topics = ['model_created']
+
+    def __init__(self):
+        self.events = []
+
+    def handle(self, topic, event):
+        self.events.append((topic, event))
+        return [('model_deployed', event)]
+
+
+def test_in_memory_bus_handles_published_before_stop():
+    first, second = RecordHandler(), RecordHandler()
+    bus = InMemoryMessageBus(first, second)
+    bus.dispatch_event('model_created', {'model': 1})
+    # no one subscribes these topics, dropped like redis pubsub
+    bus.dispatch_event('model_deleted', {'model': 1})
+    bus.dispatch_event('model_created', {'model': 2})
+    bus.stop()
+
+    bus.run()
+
+    assert first.events == second.events == [
+        ('model_created', {'model': 1}), ('model_created', {'model': 2})
+    ]
+
+
+def test_async_in_memory_bus_dispatch_and_decode():
+    handler = RecordHandler()
+    bus = AsyncInMemoryMessageBus(handler)
+
+    async def scenario():
+        runner = asyncio.ensure_future(bus.run())
+        await asyncio.sleep(0)
+        await bus.dispatch_event('model_created', {'model': (1, 2)})
+        while not handler.events:
+            await asyncio.sleep(0.01)
+        bus.stop()
+        await runner
+
+    asyncio.run(scenario())
+
+    # events go through json like redis
+    assert handler.events == [('model_created', {'model': [1, 2]})]